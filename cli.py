@@ -0,0 +1,143 @@
+"""HDF5 File Viewer command line interface, which does not need Qt."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import multiprocessing
+import os
+import pathlib
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import h5py
+
+from src.lib_h5.access import PROFILES, open_dataset, open_file
+from src.lib_h5.export import export_dataset, parse_selection
+from src.lib_h5.metadata import NodeMeta, attr_to_str, read_meta
+from src.lib_h5.recursive_iterator import NodeKind, NodeRecord, walk
+
+
+def _format_meta(meta: None | NodeMeta | NodeRecord) -> str:
+    if meta is None or meta.shape is None:
+        return ""
+    return f" {meta.shape} {meta.dtype}"
+
+
+def _format_attrs(obj: h5py.Group | h5py.Dataset, depth: int) -> list[str]:
+    return [f"{'  ' * depth}@{name} = {attr_to_str(obj.attrs, name)}" for name in obj.attrs]
+
+
+def format_tree(file_path: str, show_attrs: bool, profile: str = "auto") -> str:
+    """Walk through a file and format its tree with one line per object. Runs in worker processes."""
+    lines = [file_path]
+    try:
+        with open_file(file_path, profile) as file:
+            if show_attrs:
+                lines.extend(_format_attrs(file, 1))
+            for record in walk(file):
+                depth = record.depth + 1
+                suffix = _format_meta(record) if record.kind == NodeKind.Dataset else "/"
+                lines.append(f"{'  ' * depth}{record.path.rsplit('/', 1)[-1]}{suffix}")
+                if show_attrs:
+                    lines.extend(_format_attrs(file[record.path], depth + 1))
+    except (OSError, ValueError) as err:
+        return f"{file_path}: {err}\n"
+    return "\n".join(lines) + "\n"
+
+
+def _cmd_tree(args: argparse.Namespace) -> int:
+    """Print the trees of all files. Files are read in parallel, output keeps their order."""
+    files = [str(path) for path in args.files]
+    jobs = max(1, min(args.jobs, len(files)))
+    if jobs == 1:
+        for file_path in files:
+            sys.stdout.write(format_tree(file_path, args.attrs, args.access))
+            sys.stdout.flush()
+        return 0
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as executor:
+        for text in executor.map(format_tree, files, [args.attrs] * len(files), [args.access] * len(files)):
+            sys.stdout.write(text)
+            sys.stdout.flush()
+    return 0
+
+
+def _cmd_info(args: argparse.Namespace) -> int:
+    """Print metadata and attributes of an object."""
+    with open_file(args.file, args.access) as file:
+        obj = file[args.path]
+        meta = read_meta(obj)
+        print(f"{obj.name}: {'Dataset' if meta.shape is not None else 'Group'}{_format_meta(meta)}")
+        if isinstance(obj, h5py.Dataset):
+            print(f"  chunks: {obj.chunks}, compression: {obj.compression}")
+        for name, value in meta.attrs:
+            print(f"  @{name} = {value}")
+    return 0
+
+
+def _cmd_export(args: argparse.Namespace) -> int:
+    """Export a selection of a dataset."""
+    with open_file(args.file, args.access) as file:
+        dataset = open_dataset(file, args.path)
+        if not isinstance(dataset, h5py.Dataset):
+            print(f"'{args.path}' is not a dataset", file=sys.stderr)
+            return 1
+        shape = export_dataset(dataset, parse_selection(args.slice), args.out)
+    print(f"Exported {args.path}[{args.slice}] with shape {shape} to '{args.out}'")
+    return 0
+
+
+def main(argv: None | list[str] = None) -> int:
+    """HDF5 File Viewer command line interface."""
+    parser = argparse.ArgumentParser(description="Inspect and export HDF5 files without starting the viewer.")
+    parser.add_argument(
+        "--access",
+        choices=["auto", *PROFILES],
+        default="auto",
+        help="file access profile, auto reads small files into memory at once",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd_tree = commands.add_parser("tree", help="list groups and datasets of files")
+    cmd_tree.add_argument("files", nargs="+", type=pathlib.Path)
+    cmd_tree.add_argument("-a", "--attrs", action="store_true", help="also list attributes")
+    cmd_tree.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    cmd_tree.set_defaults(func=_cmd_tree)
+
+    cmd_info = commands.add_parser("info", help="print metadata and attributes of an object")
+    cmd_info.add_argument("file", type=pathlib.Path)
+    cmd_info.add_argument("path", nargs="?", default="/")
+    cmd_info.set_defaults(func=_cmd_info)
+
+    cmd_export = commands.add_parser("export", help="export a selection of a dataset to .npy or .csv")
+    cmd_export.add_argument("file", type=pathlib.Path)
+    cmd_export.add_argument("path")
+    cmd_export.add_argument("out", type=pathlib.Path)
+    cmd_export.add_argument("-s", "--slice", default="", help="numpy style selection, e.g. '0:100, ::2'")
+    cmd_export.set_defaults(func=_cmd_export)
+
+    args = parser.parse_args(argv)
+    try:
+        return int(args.func(args))
+    except BrokenPipeError:
+        # output was piped into a program that stopped reading, e.g. head
+        return 0
+    except (OSError, KeyError, ValueError) as err:
+        print(f"Error: {err}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
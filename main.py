@@ -15,12 +15,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import argparse
 import logging.config
+import multiprocessing
+import pathlib
 import sys
+import time
 
-from PyQt6.QtWidgets import QApplication
-
-from src.gui.main_window import MainWindow
 from src.logging_config import logging_config
 
 if sys.platform == "win32":
@@ -30,18 +31,77 @@ if sys.platform == "win32":
     ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID("hdf5viewer")
 
 
+class StartupProfile:
+    """Durations of the start-up steps, logged with --profile-startup."""
+
+    def __init__(self) -> None:
+        """Durations of the start-up steps, logged with --profile-startup."""
+        self.enabled = False
+        self._start = time.perf_counter()
+        self._last = self._start
+        self._steps: list[tuple[str, float]] = []
+
+    def mark(self, step: str) -> None:
+        """End a step."""
+        now = time.perf_counter()
+        self._steps.append((step, now - self._last))
+        self._last = now
+
+    def report(self) -> None:
+        """Log all steps and the total time."""
+        if not self.enabled:
+            return
+        lines = [f"{step:<30} {1000 * duration:8.1f} ms" for step, duration in self._steps]
+        lines.append(f"{'total':<30} {1000 * (self._last - self._start):8.1f} ms")
+        logging.info("Start-up profile:\n" + "\n".join(lines))
+
+
 def main() -> None:
     """HDF5 File Viewer entry point."""
+    # created before the arguments are parsed, so that parsing is timed too
+    profile = StartupProfile()
+    parser = argparse.ArgumentParser(description="HDF5 File Viewer")
+    parser.add_argument("files", nargs="*", type=pathlib.Path, help="files to open")
+    parser.add_argument("--debug", action="store_true", help="log debug messages")
+    parser.add_argument("--profile-startup", action="store_true", help="log the duration of all start-up steps")
+    # unknown arguments are left to Qt
+    args, qt_args = parser.parse_known_args()
+    profile.enabled = args.profile_startup
+
     logging.config.dictConfig(logging_config)
+    logging.getLogger().setLevel(logging.DEBUG if args.debug else logging.INFO)
     logging.info("Starting GUI...")
+    profile.mark("parse arguments")
+
+    # Imported here and not at module level, so that worker processes, which import this module again, stay light
+    from PyQt6.QtCore import QTimer
+    from PyQt6.QtWidgets import QApplication
+
+    profile.mark("import Qt")
+    from src.gui.main_window import MainWindow
 
-    app = QApplication(sys.argv)
+    profile.mark("import main window")
+
+    app = QApplication(sys.argv[:1] + qt_args)
     app.setOrganizationName("HDF5Viewer")
     app.setApplicationName("HDF5ViewerPython")
+    profile.mark("create application")
     main_win = MainWindow()
+    profile.mark("create main window")
     main_win.show()
+    # the first event loop iteration paints the window, the last session is restored afterwards
+    QTimer.singleShot(0, lambda: profile.mark("show main window"))
+
+    def report_profile() -> None:
+        profile.mark("restore session")
+        profile.report()
+
+    main_win.session_restored.connect(report_profile)
+    main_win.restore_session(args.files)
     sys.exit(app.exec())
 
 
 if __name__ == "__main__":
+    # Folders are opened in worker processes, which must not start the GUI again in frozen executables
+    multiprocessing.freeze_support()
     main()
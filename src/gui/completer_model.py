@@ -0,0 +1,161 @@
+"""Sorted names of all opened files for the search completer."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import bisect
+import heapq
+from collections import Counter
+from typing import Any
+
+from PyQt6.QtCore import QAbstractListModel, QModelIndex, QObject, Qt, QTimer, pyqtSlot
+
+from src.gui.tree_model import H5TreeModel
+
+# Time to collect inserted and removed names before the sorted list is updated
+UPDATE_DELAY_MS = 500
+
+# Updates that insert or remove names at more places than this reset the model instead, which is cheaper then
+MAX_ROW_UPDATES = 256
+
+
+class NameCompleterModel(QAbstractListModel):
+    """
+    Unique names of all nodes of a tree model, sorted case-insensitively.
+
+    Names are counted, so that a name shared by many nodes and files is stored once and only removed with its last
+    node. Changes of the tree are collected and inserted into or removed from the sorted list as ranges of rows, so
+    the completer keeps the rest of the model. The completer must use CaseInsensitivelySortedModel, then it finds
+    prefixes by binary search instead of copying all names.
+    """
+
+    def __init__(self, tree_model: H5TreeModel, parent: None | QObject = None) -> None:
+        """Collect the unique names of all nodes of a tree model, sorted case-insensitively."""
+        super().__init__(parent)
+        self._tree_model = tree_model
+        self._counts: Counter[str] = Counter()
+        self._names: list[str] = []
+        # names that are not in the sorted list yet, and names in the list whose last node was removed
+        self._added: set[str] = set()
+        self._removed: set[str] = set()
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(UPDATE_DELAY_MS)
+        self._timer.timeout.connect(self._update)
+        tree_model.rowsInserted.connect(self._handle_rows_inserted)
+        tree_model.rowsAboutToBeRemoved.connect(self._handle_rows_removed)
+        tree_model.modelReset.connect(self._handle_reset)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        """Get Row Count."""
+        return 0 if parent.isValid() else len(self._names)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        """Get Name."""
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole) and 0 <= index.row() < len(self._names):
+            return self._names[index.row()]
+        return None
+
+    @pyqtSlot(QModelIndex, int, int)
+    def _handle_rows_inserted(self, parent: QModelIndex, first: int, last: int) -> None:
+        for name in self._tree_model.iter_names(parent, first, last):
+            if self._counts[name] == 0:
+                if name in self._removed:
+                    self._removed.discard(name)
+                else:
+                    self._added.add(name)
+            self._counts[name] += 1
+        self._timer.start()
+
+    @pyqtSlot(QModelIndex, int, int)
+    def _handle_rows_removed(self, parent: QModelIndex, first: int, last: int) -> None:
+        # removed files take all their nodes with them, removed groups only their direct children
+        for name in self._tree_model.iter_names(parent, first, last):
+            self._counts[name] -= 1
+            if self._counts[name] <= 0:
+                del self._counts[name]
+                if name in self._added:
+                    self._added.discard(name)
+                else:
+                    self._removed.add(name)
+        self._timer.start()
+
+    @pyqtSlot()
+    def _handle_reset(self) -> None:
+        self._timer.stop()
+        self.beginResetModel()
+        self._counts.clear()
+        self._names = []
+        self._added = set()
+        self._removed = set()
+        self.endResetModel()
+
+    @pyqtSlot()
+    def _update(self) -> None:
+        """Remove and insert the collected names as ranges of rows, or reset the model for many small ranges."""
+        removed = _ranges(sorted(self._find(name) for name in self._removed))
+        added = sorted(self._added, key=str.lower)
+        self._added = set()
+        self._removed = set()
+        if len(removed) > MAX_ROW_UPDATES:
+            self._reset(added)
+            return
+        # from the end, so that the rows of the ranges before are not moved
+        for start, stop in reversed(removed):
+            self.beginRemoveRows(QModelIndex(), start, stop - 1)
+            del self._names[start:stop]
+            self.endRemoveRows()
+
+        # names that go to the same row are inserted as one range
+        groups: list[tuple[int, int, int]] = []
+        for i, name in enumerate(added):
+            row = bisect.bisect_right(self._names, name.lower(), key=str.lower)
+            if groups and groups[-1][0] == row:
+                groups[-1] = (row, groups[-1][1], i + 1)
+            else:
+                groups.append((row, i, i + 1))
+        if len(groups) > MAX_ROW_UPDATES:
+            self._reset(added)
+            return
+        for row, start, stop in reversed(groups):
+            self.beginInsertRows(QModelIndex(), row, row + stop - start - 1)
+            self._names[row:row] = added[start:stop]
+            self.endInsertRows()
+
+    def _reset(self, added: list[str]) -> None:
+        """Merge sorted added names into the list and drop removed names in one model reset."""
+        self.beginResetModel()
+        names = [name for name in self._names if name in self._counts]
+        self._names = list(heapq.merge(names, added, key=str.lower))
+        self.endResetModel()
+
+    def _find(self, name: str) -> int:
+        """Get the row of a name in the sorted list."""
+        row = bisect.bisect_left(self._names, name.lower(), key=str.lower)
+        while self._names[row] != name:
+            row += 1
+        return row
+
+
+def _ranges(rows: list[int]) -> list[tuple[int, int]]:
+    """Group sorted rows into ranges of consecutive rows, as (start, stop)."""
+    ranges: list[tuple[int, int]] = []
+    for row in rows:
+        if ranges and ranges[-1][1] == row:
+            ranges[-1] = (ranges[-1][0], row + 1)
+        else:
+            ranges.append((row, row + 1))
+    return ranges
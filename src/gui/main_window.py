@@ -18,25 +18,25 @@
 import logging
 import os
 import pathlib
+import re
+import sqlite3
 import sys
-from typing import Any, Generator
+from typing import TYPE_CHECKING, Any
 
 import h5py
-import numpy as np
-import pyqtgraph as pg
-from natsort import natsorted
-from PyQt6.QtCore import QModelIndex, QPoint, QSettings, QSize, QSortFilterProxyModel, Qt, pyqtSlot
-from PyQt6.QtGui import (
-    QAction,
-    QCloseEvent,
-    QDragEnterEvent,
-    QDropEvent,
-    QIcon,
-    QKeySequence,
-    QShortcut,
-    QStandardItem,
-    QStandardItemModel,
+from PyQt6.QtCore import (
+    QModelIndex,
+    QPoint,
+    QSettings,
+    QSize,
+    QStandardPaths,
+    Qt,
+    QThreadPool,
+    QTimer,
+    pyqtSignal,
+    pyqtSlot,
 )
+from PyQt6.QtGui import QAction, QCloseEvent, QDragEnterEvent, QDropEvent, QIcon, QKeySequence, QShortcut
 from PyQt6.QtWidgets import (
     QComboBox,
     QCompleter,
@@ -47,24 +47,52 @@ from PyQt6.QtWidgets import (
     QLineEdit,
     QMainWindow,
     QMenu,
+    QProgressBar,
     QPushButton,
     QTableView,
-    QTextBrowser,
     QTreeView,
     QVBoxLayout,
     QWidget,
 )
 
 from src.gui.about_page import AboutPage
-from src.gui.table_model import DataTable, TableModel
+from src.gui.completer_model import NameCompleterModel
+from src.gui.open_folder_dialog import OpenFolderDialog
+from src.gui.table_model import H5AttributeTable
+from src.gui.tree_model import H5TreeFilterModel, H5TreeModel
+from src.gui.workers import DatasetLoader, FolderLoader, TreeIndexer
 from src.img.img_path import img_path
+from src.lib_h5.access import PROFILES
 from src.lib_h5.dataset_types import H5DatasetType
+from src.lib_h5.decimate import Envelope
+from src.lib_h5.file_pool import H5FilePool
 from src.lib_h5.file_size import file_size_to_str
+from src.lib_h5.metadata import NodeMeta
+from src.lib_h5.node_table import NodeTable
+from src.lib_h5.pyramid import ImagePyramid, PyramidCache
+from src.lib_h5.search_index import SearchQuery
+from src.lib_h5.statistics import StatisticsCache
+from src.lib_h5.structure_cache import StructureCache
+
+if TYPE_CHECKING:
+    from src.gui.plot_widgets import PlotWidgetManager
+    from src.gui.statistics_panel import StatisticsPanel
+
+# Maximum number of search results that are shown in the tree
+SEARCH_MAX_RESULTS = 1000
+
+# Time to wait after the last key press before searching
+FILTER_DELAY_MS = 200
+
+# Maximum time between changes of the files and searching them again, while search results are shown
+SEARCH_REFRESH_MS = 500
 
 
 class MainWindow(QMainWindow):
     """Start Main Window of the GUI."""
 
+    session_restored = pyqtSignal()
+
     def __init__(self) -> None:
         """Start Main Window of the GUI."""
         super().__init__(flags=Qt.WindowType.Window)
@@ -74,6 +102,25 @@ class MainWindow(QMainWindow):
         self.cur_file = pathlib.Path()
         self.cur_obj_path = ""
         self.icon_dir = img_path()
+        # access profile can be set in the settings file, e.g. "core" to read files into memory when they are opened
+        profile = str(QSettings().value("file_access/profile", defaultValue="auto"))
+        self.file_pool = H5FilePool(profile=profile if profile in PROFILES else "auto")
+        self.thread_pool = QThreadPool()
+        # h5py serializes all calls, so indexing more than one file at once would only slow down plotting
+        self.index_pool = QThreadPool()
+        self.index_pool.setMaxThreadCount(1)
+        self._indexers: dict[int, TreeIndexer] = {}
+        self._folder_loader: None | FolderLoader = None
+        self.pyramid_cache = PyramidCache()
+        self.statistics_cache = StatisticsCache()
+        cache_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation)
+        try:
+            self.structure_cache: None | StructureCache = StructureCache(pathlib.Path(cache_dir, "structure.sqlite"))
+        except (OSError, sqlite3.Error) as err:
+            logging.warning(f"Structure cache is disabled. Error: '{err}'")
+            self.structure_cache = None
+        self._loader: None | DatasetLoader = None
+        self._load_request = 0
 
         # Appearance
         settings = QSettings()
@@ -84,12 +131,18 @@ class MainWindow(QMainWindow):
         self.setWindowIcon(QIcon(str(pathlib.Path(self.icon_dir, "file.svg"))))
 
         # Layout Right Side
-        self.table_model_dataset = TableModel(header=["Attribute", "Value"])
+        self.table_model_dataset = H5AttributeTable(self.file_pool)
         self.table_view_dataset = QTableView()
         self.table_view_dataset.setMinimumWidth(700)
         self.table_view_dataset.setModel(self.table_model_dataset)
         self.table_view_dataset.setColumnWidth(1, 300)
-        self.plot_wgt_dataset = pg.PlotWidget()
+        self.table_view_dataset.doubleClicked.connect(lambda index: self.table_model_dataset.expand(index.row()))
+        # pyqtgraph is only imported when the first dataset is plotted, until then the dock shows a placeholder
+        self.plot_wgt_dataset = QWidget()
+        self._plot_manager: "None | PlotWidgetManager" = None
+        self._shown_type: None | H5DatasetType = None
+        self.stats_wgt_dataset = QWidget()
+        self._statistics_panel: "None | StatisticsPanel" = None
 
         self.dock_table = QDockWidget()
         self.dock_table.setWindowTitle("Attributes")
@@ -99,15 +152,24 @@ class MainWindow(QMainWindow):
         self.dock_plot.setWindowTitle("Data")
         self.dock_plot.setWidget(self.plot_wgt_dataset)
         self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.dock_plot)
+        self.dock_statistics = QDockWidget()
+        self.dock_statistics.setWindowTitle("Statistics")
+        self.dock_statistics.setWidget(self.stats_wgt_dataset)
+        self.addDockWidget(Qt.DockWidgetArea.RightDockWidgetArea, self.dock_statistics)
+        self.tabifyDockWidget(self.dock_table, self.dock_statistics)
+        self.dock_table.raise_()
+        self.progress_load = QProgressBar()
+        self.progress_load.setMaximumWidth(200)
+        self.progress_load.hide()
+        if (status_bar := self.statusBar()) is not None:
+            status_bar.addPermanentWidget(self.progress_load)
 
         # Center Layout
         self.tree_view_file = QTreeView()
         self.tree_view_file.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.tree_view_file.customContextMenuRequested.connect(self._handle_tree_menu)
-        self.tree_model_file = QStandardItemModel()
-        self.tree_model_file.setHorizontalHeaderLabels(["Name", "Type"])
-        self.tree_model_file_proxy = QSortFilterProxyModel()
-        self.tree_model_file_proxy.setRecursiveFilteringEnabled(True)
+        self.tree_model_file = H5TreeModel(self.icon_dir, self.file_pool)
+        self.tree_model_file_proxy = H5TreeFilterModel()
 
         self.tree_model_file_proxy.setSourceModel(self.tree_model_file)
         self.tree_view_file.setModel(self.tree_model_file_proxy)
@@ -123,16 +185,38 @@ class MainWindow(QMainWindow):
         self.btn_filter_case.clicked.connect(self._handle_filter_changed)
         self.le_filter = QLineEdit()
         self.le_filter.setPlaceholderText("Search in all files (press 'f' to focus)")
+        self.le_filter.setToolTip(
+            "Search paths, attribute names and attribute values of all files.\n"
+            "Filter datasets with dtype:float32, shape[0]>1e6, ndim=2 or size<=100."
+        )
         self.act_filter = QShortcut(QKeySequence(Qt.Key.Key_F), self)
         self.act_filter.activated.connect(self.le_filter.setFocus)
-        self.le_filter.textEdited.connect(self._handle_filter_changed)
-        self.completer = QCompleter()
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DELAY_MS)
+        self.filter_timer.timeout.connect(self._handle_filter_changed)
+        self.le_filter.textEdited.connect(self.filter_timer.start)
+        self.search_refresh_timer = QTimer(self)
+        self.search_refresh_timer.setSingleShot(True)
+        self.search_refresh_timer.setInterval(SEARCH_REFRESH_MS)
+        self.search_refresh_timer.timeout.connect(self._refresh_search)
+        # text, case flag and matches of the last search, if it only had plain text parts and files did not change since
+        self._last_search: None | tuple[str, bool, list[QModelIndex]] = None
+        for signal in (
+            self.tree_model_file.rowsInserted,
+            self.tree_model_file.rowsRemoved,
+            self.tree_model_file.modelReset,
+            self.tree_model_file.dataChanged,
+        ):
+            signal.connect(self._handle_files_changed)
+        self.completer = QCompleter(NameCompleterModel(self.tree_model_file, self), self)
+        self.completer.setModelSorting(QCompleter.ModelSorting.CaseInsensitivelySortedModel)
         self.completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
         self.le_filter.setCompleter(self.completer)
 
         lyt_plot_type = QFormLayout()
         self.cb_plot_type = QComboBox()
-        self.cb_plot_type.addItems(["Auto", "String", "Array1D", "Array2D", "ImageRGB", "Table"])
+        self.cb_plot_type.addItems(["Auto", "String", "Array1D", "Array2D", "ImageRGB", "Table", "Slices"])
         self.cb_plot_type.currentTextChanged.connect(self._handle_plot_type_changed)
         lyt_plot_type.addRow("Plot as", self.cb_plot_type)
 
@@ -184,25 +268,24 @@ class MainWindow(QMainWindow):
             act_about.triggered.connect(self._handle_action_about)
             mbr_help.addAction(act_about)
 
-        # Open File when double-clicking
-        if len(sys.argv) > 1:
-            self._open_file(pathlib.Path(sys.argv[0]))
-        for file in settings.value("settings/last_opened_files", ()):
-            self._open_file(file)
+    def restore_session(self, file_paths: list[pathlib.Path]) -> None:
+        """
+        Open the given files and the files of the last session, one file per event loop iteration.
 
-    @staticmethod
-    def iter_items(root: QStandardItem) -> Generator[Any, Any, None]:
-        """Iterate recursively through all children of a QStandardItem."""
+        Called after the window is shown. Files in the structure cache are shown without opening them, all others
+        only read their root group here and are indexed in the background.
+        """
+        settings = QSettings()
+        queue = list(file_paths) + [pathlib.Path(file) for file in settings.value("settings/last_opened_files", ())]
 
-        def recurse(parent: QStandardItem) -> Generator[Any, Any, None]:
-            for row in range(parent.rowCount()):
-                if (child := parent.child(row, 0)) is not None:
-                    yield child.text()
-                    if child.hasChildren():
-                        yield from recurse(child)
+        def open_next() -> None:
+            if not queue:
+                self.session_restored.emit()
+                return
+            self._open_file(queue.pop(0))
+            QTimer.singleShot(0, open_next)
 
-        if root is not None:
-            yield from recurse(root)
+        QTimer.singleShot(0, open_next)
 
     @property
     def selected_item(self) -> tuple[pathlib.Path, str, Any]:
@@ -210,7 +293,7 @@ class MainWindow(QMainWindow):
         if not self.cur_obj_path:
             obj_type = h5py.File
         else:
-            with h5py.File(self.cur_file, "r") as file:
+            with self.file_pool.lease(self.cur_file) as file:
                 obj_type = type(file[self.cur_obj_path])
 
         return self.cur_file, self.cur_obj_path, obj_type
@@ -218,11 +301,7 @@ class MainWindow(QMainWindow):
     @property
     def opened_files(self) -> tuple[pathlib.Path, ...]:
         """Currently opened files."""
-        file_paths = []
-        for i in range(self.tree_model_file.rowCount()):
-            if (item := self.tree_model_file.item(i, 0)) is not None:
-                file_paths.append(pathlib.Path(item.text()))
-        return tuple(file_paths)
+        return tuple(self.tree_model_file.file_paths)
 
     def _open_file(self, file_path: pathlib.Path) -> None:
         """
@@ -231,125 +310,161 @@ class MainWindow(QMainWindow):
         :param str file_path: File Path
         """
         logging.info(f"Open file '{file_path}'")
+        if self.structure_cache is not None and (cached := self.structure_cache.get(file_path)) is not None:
+            # the file itself is only opened once an object is selected
+            self.tree_model_file.add_table(*cached)
+            return
+
         try:
-            # Load TreeModel from File
-            with h5py.File(file_path, "r") as file:
-                parent_name = QStandardItem(str(file_path))
-                parent_name.setEditable(False)
-                parent_text = QStandardItem("HDF5 File")
-                parent_text.setEditable(False)
-                parent_text.setIcon(QIcon(str(pathlib.Path(self.icon_dir, "file.svg"))))
-                self._hdf5_recursion(hdf5_object=file, root=parent_name, parent=parent_name)
-                self.tree_model_file.appendRow([parent_name, parent_text])
+            # Only the root group is read here, groups are read when they are expanded
+            slot = self.tree_model_file.add_file(file_path)
         except (OSError, ValueError) as err:
             logging.warning(f"Failed to open file. Error: '{err}'")
+            return
 
-        if (root := self.tree_model_file.invisibleRootItem()) is not None:
-            self.completer = QCompleter(list(self.iter_items(root)))
-            self.completer.setCaseSensitivity(
-                Qt.CaseSensitivity.CaseSensitive
-                if self.btn_filter_case.isChecked()
-                else Qt.CaseSensitivity.CaseInsensitive
-            )
-            self.le_filter.setCompleter(self.completer)
-
-    def _hdf5_recursion(
-        self,
-        hdf5_object: h5py.File | h5py.Group | h5py.Dataset,
-        root: QStandardItem,
-        parent: QStandardItem,
-    ) -> None:
-        """Recursively go through hdf5 File and construct tree view model."""
-        for name in natsorted(hdf5_object):
-            value = hdf5_object[name]
-            if isinstance(value, h5py.Group):
-                child_name = QStandardItem(name)
-                child_name.setEditable(False)
-                child_type = QStandardItem("Group")
-                child_type.setEditable(False)
-                child_type.setIcon(QIcon(str(pathlib.Path(self.icon_dir, "group.svg"))))
-                parent.appendRow([child_name, child_type])
-                self._hdf5_recursion(value, root, child_name)
-            elif isinstance(value, h5py.Dataset):
-                child_name = QStandardItem(name)
-                child_name.setEditable(False)
-                child_type = QStandardItem("Dataset")
-                child_type.setEditable(False)
-                child_type.setIcon(QIcon(str(pathlib.Path(self.icon_dir, "dataset.svg"))))
-                parent.appendRow([child_name, child_type])
+        # the rest of the tree is read in the background
+        indexer = TreeIndexer(slot, self.file_pool, self.structure_cache, file_path)
+        indexer.signals.batch.connect(self.tree_model_file.merge_children)
+        indexer.signals.finished.connect(self._handle_indexing_finished)
+        indexer.signals.failed.connect(self._handle_indexing_failed)
+        self._indexers[slot] = indexer
+        self.tree_model_file.start_indexing(slot)
+        self.index_pool.start(indexer)
+
+    @pyqtSlot(int, object)
+    def _handle_indexing_finished(self, slot: int, metadata: dict[str, NodeMeta]) -> None:
+        """Keep metadata of the indexed file."""
+        self.tree_model_file.set_metadata(slot, metadata)
+        self._handle_indexing_failed(slot)
+
+    @pyqtSlot(int)
+    @pyqtSlot(int, str)
+    def _handle_indexing_failed(self, slot: int, error: str = "") -> None:
+        """Forget finished or failed indexer."""
+        self._indexers.pop(slot, None)
+        self.tree_model_file.stop_indexing(slot)
+
+    def _cancel_indexing(self, slot: int) -> None:
+        """Cancel indexer of a file, the tree keeps all nodes read so far."""
+        if (indexer := self._indexers.pop(slot, None)) is not None:
+            indexer.cancel()
+        self.tree_model_file.stop_indexing(slot)
 
     @pyqtSlot()
     def _plot_data(self, plot_type: str = "") -> None:
         """
-        Update Plot Widget.
+        Start loading the selected object in the background. A load that is still running is cancelled.
 
         :param str plot_type: Plot Type
         """
         if self.cur_file is None or not self.cur_obj_path or not os.path.exists(self.cur_file):
             return
 
-        with h5py.File(self.cur_file, "r") as file:
-            h5_obj = file[self.cur_obj_path]
-            if isinstance(h5_obj, h5py.Group):
-                data = np.array([name for name in file[self.cur_obj_path]])
-                data_type = H5DatasetType.String
-            if isinstance(h5_obj, h5py.Dataset):
-                data = np.array(file[self.cur_obj_path])
-                if plot_type and plot_type != "Auto":
-                    data_type = H5DatasetType.from_string(plot_type)
-                else:
-                    data_type = H5DatasetType.from_numpy_array(data)
-
-        new_widget: QTextBrowser | pg.PlotWidget | pg.ImageView | QTableView | QWidget
+        if self._loader is not None:
+            self._loader.cancel()
+        self._load_request += 1
+        self._loader = DatasetLoader(
+            self._load_request, self.file_pool, self.pyramid_cache, self.cur_file, self.cur_obj_path, plot_type
+        )
+        self._loader.signals.progress.connect(self._handle_load_progress)
+        self._loader.signals.finished.connect(self._show_data)
+        self._loader.signals.failed.connect(self._handle_load_failed)
+        self.progress_load.setValue(0)
+        self.progress_load.show()
+        self.thread_pool.start(self._loader)
+
+    @pyqtSlot(int, object, object)
+    def _show_data(self, request_id: int, data_type: H5DatasetType, data: Any) -> None:
+        """
+        Update Plot Widget with data prepared by a DatasetLoader.
+
+        :param int request_id: Id of the load request, results of outdated requests are dropped
+        :param H5DatasetType data_type: Plot Type
+        :param data: Data prepared with prepare_plot_data
+        """
+        if request_id != self._load_request:
+            return
+        self._loader = None
+        self.progress_load.hide()
+        plot_type = data_type.name
+
+        # imported here, so that pyqtgraph does not slow down the start
+        from src.gui.plot_widgets import (
+            CurvePlotWidget,
+            DatasetTableView,
+            DecimatedPlotWidget,
+            ImageWidget,
+            PlotWidgetManager,
+            PyramidImageView,
+            SliceNavigator,
+            TextPreview,
+        )
+        from src.gui.statistics_panel import StatisticsPanel
+
+        if self._plot_manager is None:
+            self._plot_manager = PlotWidgetManager(self.file_pool, self.thread_pool)
+            self.dock_plot.setWidget(self._plot_manager)
+            self.plot_wgt_dataset.deleteLater()
+        if self._statistics_panel is None:
+            self._statistics_panel = StatisticsPanel(self.file_pool, self.thread_pool, self.statistics_cache)
+            self._statistics_panel.levels_found.connect(self._apply_levels)
+            self.dock_statistics.setWidget(self._statistics_panel)
+            self.stats_wgt_dataset.deleteLater()
+
+        kind: type[QWidget]
         if data_type == H5DatasetType.String:
-            if data.ndim == 0:
-                label = data.item()
-                if isinstance(label, bytes):
-                    label = label.decode()
-                label = str(label)
-            else:
-                label = str(data)
-            new_widget = QTextBrowser()
-            new_widget.setText(label)
+            kind = TextPreview
+        elif data_type == H5DatasetType.Array1D and isinstance(data, Envelope):
+            kind = DecimatedPlotWidget
         elif data_type == H5DatasetType.Array1D:
-            if data.ndim == 2 and min(data.shape) == 1:
-                data = data.ravel()
-            new_widget = pg.PlotWidget()
-            try:
-                new_widget.plot(data)
-            except Exception as err:
-                logging.error(f"Failed plot dataset as '{plot_type}'. Error: '{err}'")
-                return
-        elif data_type == H5DatasetType.Array2D:
-            new_widget = pg.ImageView()
-            try:
-                new_widget.setImage(data)
-            except Exception as err:
-                logging.error(f"Failed plot dataset as '{plot_type}'. Error: '{err}'")
-                return
-            new_widget.setColorMap(pg.colormap.get("inferno"))
+            kind = CurvePlotWidget
+        elif data_type in (H5DatasetType.Array2D, H5DatasetType.ImageRGB) and isinstance(data, ImagePyramid):
+            kind = PyramidImageView
+        elif data_type in (H5DatasetType.Array2D, H5DatasetType.ImageRGB):
+            kind = ImageWidget
         elif data_type == H5DatasetType.Table:
-            new_widget = QTableView()
-            model = DataTable(data)
-            new_widget.setModel(model)
-        elif data_type == H5DatasetType.ImageRGB:
-            data = np.sum(data, axis=0)
-            new_widget = pg.ImageView()
-            try:
-                new_widget.setImage(data)
-            except Exception as err:
-                logging.error(f"Failed plot dataset as '{plot_type}'. Error: '{err}'")
-                return
-            new_widget.setColorMap(pg.colormap.get("inferno"))
+            kind = DatasetTableView
+        elif data_type == H5DatasetType.Slices:
+            kind = SliceNavigator
         else:
-            new_widget = QWidget()
+            self._shown_type = None
+            self._plot_manager.show_empty()
+            return
 
-        # Replace old Plot Widget
-        self.dock_plot.setWidget(new_widget)
-        # self.lyt_dataset.replaceWidget(self.plot_wgt_dataset, new_widget)
-        # self.plot_wgt_dataset.hide()
-        # self.plot_wgt_dataset.destroy()
-        # self.plot_wgt_dataset = new_widget
+        try:
+            self._plot_manager.show_data(kind, self.cur_file, self.cur_obj_path, data)
+            self._shown_type = data_type
+        except Exception as err:
+            logging.error(f"Failed plot dataset as '{plot_type}'. Error: '{err}'")
+            self._shown_type = None
+            self._plot_manager.show_empty()
+        # after the data is shown, so that levels of cached statistics are applied to it
+        self._statistics_panel.show_object(self.cur_file, self.cur_obj_path)
+
+    @pyqtSlot(int, int)
+    def _handle_load_progress(self, request_id: int, percent: int) -> None:
+        """Update progress bar of the running load."""
+        if request_id == self._load_request:
+            self.progress_load.setValue(percent)
+
+    @pyqtSlot(int, str)
+    def _handle_load_failed(self, request_id: int, error: str) -> None:
+        """Hide progress bar when the running load failed."""
+        if request_id != self._load_request:
+            return
+        self._loader = None
+        self.progress_load.hide()
+        self._shown_type = None
+        if self._plot_manager is not None:
+            self._plot_manager.show_empty()
+        if self._statistics_panel is not None:
+            self._statistics_panel.show_object(self.cur_file, self.cur_obj_path)
+
+    @pyqtSlot(object)
+    def _apply_levels(self, levels: tuple[float, float]) -> None:
+        """Use levels from the statistics of the shown dataset, except for RGB images, they show the channel sum."""
+        if self._plot_manager is not None and self._shown_type in (H5DatasetType.Array2D, H5DatasetType.Slices):
+            self._plot_manager.set_levels(levels)
 
     # ----- Drag & Drop ----- #
     def dragEnterEvent(self, event: QDragEnterEvent | None) -> None:
@@ -401,25 +516,23 @@ class MainWindow(QMainWindow):
         self.cur_obj_path = path
 
         if len(parents_list) == 1:
-            self.table_model_dataset.resetData()
-            self.table_model_dataset.appendRow(["Name", parents_list[0]])
-            self.table_model_dataset.appendRow(["File Size", file_size_to_str(parents_list[0])])
+            self.table_model_dataset.show_object(
+                self.cur_file, "", [("Name", parents_list[0]), ("File Size", file_size_to_str(parents_list[0]))]
+            )
             return
 
-        with h5py.File(parents_list[0], "r") as file:
-            h5_obj = file[path]
-
-            if isinstance(h5_obj, h5py.Group):
-                self.table_model_dataset.resetData()
-                self.table_model_dataset.appendRow(["Name", str(h5_obj.name)])
-
-            elif isinstance(h5_obj, h5py.Dataset):
-                self.table_model_dataset.resetData()
-                self.table_model_dataset.appendRow(["Name", str(h5_obj.name)])
-                self.table_model_dataset.appendRow(["Data", f"shape {h5_obj.shape} of type {h5_obj.dtype}"])
-
-                for attribute, value in h5_obj.attrs.items():
-                    self.table_model_dataset.appendRow([attribute, str(value)])
+        try:
+            with self.file_pool.lease(parents_list[0]) as file:
+                h5_obj = file[path]
+                info = [("Name", str(h5_obj.name))]
+                if isinstance(h5_obj, h5py.Dataset):
+                    info.append(("Data", f"shape {h5_obj.shape} of type {h5_obj.dtype}"))
+        except (OSError, KeyError) as err:
+            logging.warning(f"Failed to open '{path}' in file '{parents_list[0]}'. Error: '{err}'")
+            self._show_status(f"Failed to open '{path}'")
+            return
+        # only attribute names are read here, values are read when their row is shown
+        self.table_model_dataset.show_object(self.cur_file, path, info)
 
         self._plot_data(self.cb_plot_type.currentText())
 
@@ -430,37 +543,107 @@ class MainWindow(QMainWindow):
         path.append(data)
         self._tree_recursion(item.parent(), path)
 
+    @pyqtSlot()
+    def _handle_files_changed(self) -> None:
+        """Files changed, so the next search can not refine the matches of the last one and shown matches are old."""
+        self._last_search = None
+        if self.le_filter.text() and not self.search_refresh_timer.isActive():
+            self.search_refresh_timer.start()
+
+    @pyqtSlot()
+    def _refresh_search(self) -> None:
+        """Search again, so that opened and indexed files show their matches. Expanded rows stay expanded."""
+        self._search(collapse=False)
+
     @pyqtSlot()
     def _handle_filter_changed(self) -> None:
+        """Search with the changed text or options, starting from a collapsed tree."""
+        self._search(collapse=True)
+
+    def _search(self, collapse: bool) -> None:
+        """Search all files and show only the matches and their parents."""
+        self.filter_timer.stop()
+        self.search_refresh_timer.stop()
         text = self.le_filter.text()
-        if text:
-            self.tree_view_file.expandAll()
-        else:
-            self.tree_view_file.collapseAll()
-        self.tree_model_file_proxy.setFilterCaseSensitivity(
-            Qt.CaseSensitivity.CaseSensitive if self.btn_filter_case.isChecked() else Qt.CaseSensitivity.CaseInsensitive
-        )
-        if self.btn_filter_regex.isChecked():
-            self.tree_model_file_proxy.setFilterRegularExpression(text)
-        else:
-            self.tree_model_file_proxy.setFilterFixedString(text)
+        regex = self.btn_filter_regex.isChecked()
+        case_sensitive = self.btn_filter_case.isChecked()
         self.completer.setCaseSensitivity(
-            Qt.CaseSensitivity.CaseSensitive if self.btn_filter_case.isChecked() else Qt.CaseSensitivity.CaseInsensitive
+            Qt.CaseSensitivity.CaseSensitive if case_sensitive else Qt.CaseSensitivity.CaseInsensitive
         )
+        if collapse:
+            self.tree_view_file.collapseAll()
+        if not text:
+            self.tree_model_file_proxy.set_visible(None)
+            self._show_status("")
+            return
+        try:
+            query = SearchQuery(text, regex, case_sensitive)
+        except re.error as err:
+            self._show_status(f"Invalid regular expression: {err}")
+            return
+
+        # Appending text to a query of plain text parts can only remove matches, so only the last ones are searched.
+        # This does not hold for regular expressions and predicates, or if the last search stopped at the limit.
+        refinable = not regex and not query.predicates
+        within = None
+        if self._last_search is not None and refinable:
+            last_text, last_case_sensitive, last_matches = self._last_search
+            if (
+                text.startswith(last_text)
+                and last_case_sensitive == case_sensitive
+                and len(last_matches) < SEARCH_MAX_RESULTS
+            ):
+                within = last_matches
+        matches = self.tree_model_file.search(query, SEARCH_MAX_RESULTS, within)
+        self._last_search = (text, case_sensitive, matches) if refinable else None
+        visible: set[int] = set()
+        parents: list[QModelIndex] = []
+        for index in matches:
+            visible.add(index.internalId())
+            while (index := index.parent()).isValid() and index.internalId() not in visible:
+                visible.add(index.internalId())
+                parents.append(index)
+        self.tree_model_file_proxy.set_visible(visible)
+        # parents were collected from the matches upwards, expand them from the files downwards
+        for index in reversed(parents):
+            self.tree_view_file.expand(self.tree_model_file_proxy.mapFromSource(index))
+
+        if len(matches) >= SEARCH_MAX_RESULTS:
+            self._show_status(f"Showing the first {SEARCH_MAX_RESULTS} matches")
+        else:
+            self._show_status(f"{len(matches)} matches")
+
+    def _show_status(self, message: str) -> None:
+        """Show message in the status bar, or clear it for an empty message."""
+        if (status_bar := self.statusBar()) is not None:
+            status_bar.showMessage(message)
 
     @pyqtSlot(QPoint)
     def _handle_tree_menu(self, pos: QPoint) -> None:
         # TODO: reload file button
         menu = QMenu(self)
         index = self.tree_view_file.indexAt(pos)
-        if index.parent().data() is None:
+        if index.isValid() and index.parent().data() is None:
+            source_index = self.tree_model_file_proxy.mapToSource(index)
+            slot = self.tree_model_file.slot(source_index.row())
+            if self.tree_model_file.is_indexing(slot):
+                act_cancel = QAction("Cancel indexing", self)
+                menu.addAction(act_cancel)
+                act_cancel.triggered.connect(lambda: self._cancel_indexing(slot))
             action = QAction("Close file", self)
             menu.addAction(action)
-            action.triggered.connect(lambda: self.tree_model_file.removeRow(index.row()))
+            action.triggered.connect(lambda: self._close_file(source_index.row()))
 
         if (viewport := self.tree_view_file.viewport()) is not None:
             menu.popup(viewport.mapToGlobal(pos))
 
+    def _close_file(self, row: int) -> None:
+        """Remove file from tree and close its handle."""
+        file_path = self.tree_model_file.file_paths[row]
+        self._cancel_indexing(self.tree_model_file.slot(row))
+        self.tree_model_file.removeRow(row)
+        self.file_pool.close(file_path)
+
     @pyqtSlot()
     def _handle_action_open_file(self) -> None:
         """Open HDF5 Files."""
@@ -485,25 +668,63 @@ class MainWindow(QMainWindow):
     @pyqtSlot()
     def _handle_action_open_folder(self) -> None:
         """Open all HDF5 Files in a Folder."""
-        settings = QSettings()
-        folder: pathlib.Path = settings.value(
-            "paths/last_opened_folder_directory",
-            defaultValue=pathlib.Path(os.path.expanduser("~")),
-        )
-        default_path = str(folder.absolute()) if folder.absolute().exists() else os.path.expanduser("~")
-        folder_path = QFileDialog.getExistingDirectory(self, "Open Folder", default_path)
-        if not folder_path:
+        dialog = OpenFolderDialog(self)
+        if dialog.exec() != OpenFolderDialog.DialogCode.Accepted:
             return
+        self._open_folder(dialog.folder, dialog.pattern, dialog.recursive)
 
-        settings.setValue("paths/last_opened_folder_directory", pathlib.Path(folder_path))
-        for file in os.listdir(folder_path):
-            self._open_file(pathlib.Path(folder_path, file))
+    def _open_folder(self, folder: pathlib.Path, pattern: str = "*", recursive: bool = False) -> None:
+        """
+        Open all HDF5 Files in a Folder. The files are read in parallel in worker processes.
+
+        :param folder: Folder Path
+        :param pattern: glob pattern of the file names
+        :param recursive: also open files in subfolders
+        """
+        if self._folder_loader is not None:
+            self._folder_loader.cancel()
+        self._folder_loader = FolderLoader(self.structure_cache, folder, pattern, recursive, self.file_pool.profile)
+        self._folder_loader.signals.opened.connect(self._handle_folder_opened)
+        self._folder_loader.signals.progress.connect(self._handle_folder_progress)
+        self._folder_loader.signals.finished.connect(self._handle_folder_finished)
+        self.thread_pool.start(self._folder_loader)
+
+    def _is_current_folder_loader(self) -> bool:
+        """Check if the sender of a signal is the running folder loader, and not a cancelled one."""
+        return self._folder_loader is not None and self.sender() is self._folder_loader.signals
+
+    @pyqtSlot(object, object)
+    def _handle_folder_opened(self, table: NodeTable, metadata: dict[str, NodeMeta]) -> None:
+        """Add file read by the folder loader."""
+        if self._is_current_folder_loader():
+            self.tree_model_file.add_table(table, metadata)
+
+    @pyqtSlot(int, int)
+    def _handle_folder_progress(self, done: int, total: int) -> None:
+        """Show number of opened files."""
+        if not self._is_current_folder_loader():
+            return
+        self._show_status(f"Opening folder: {done} of {total} files")
+
+    @pyqtSlot()
+    def _handle_folder_finished(self) -> None:
+        """Clear status of finished folder loader."""
+        if not self._is_current_folder_loader():
+            return
+        self._folder_loader = None
+        self._show_status("")
 
     @pyqtSlot()
     def _handle_action_clear_files(self) -> None:
         """Clear Tree Widget."""
+        if self._folder_loader is not None:
+            self._folder_loader.cancel()
+            self._folder_loader = None
+        for slot in list(self._indexers):
+            self._cancel_indexing(slot)
         self.tree_model_file.clear()
-        self.table_model_dataset.resetData()
+        self.table_model_dataset.clear()
+        self.file_pool.close_all()
 
     @pyqtSlot()
     def _handle_action_about(self) -> None:
@@ -526,3 +747,14 @@ class MainWindow(QMainWindow):
         settings.setValue("main_window/position", self.pos())
         settings.setValue("settings/last_opened_files", self.opened_files)
         settings.sync()
+        if self._loader is not None:
+            self._loader.cancel()
+        if self._folder_loader is not None:
+            self._folder_loader.cancel()
+        if self._statistics_panel is not None:
+            self._statistics_panel.cancel()
+        for slot in list(self._indexers):
+            self._cancel_indexing(slot)
+        self.thread_pool.waitForDone()
+        self.index_pool.waitForDone()
+        self.file_pool.close_all()
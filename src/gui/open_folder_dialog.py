@@ -0,0 +1,97 @@
+"""Dialog to choose a folder, a file name pattern and whether subfolders are searched."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import pathlib
+
+from PyQt6.QtCore import QSettings, pyqtSlot
+from PyQt6.QtWidgets import (
+    QCheckBox,
+    QDialog,
+    QDialogButtonBox,
+    QFileDialog,
+    QFormLayout,
+    QHBoxLayout,
+    QLineEdit,
+    QPushButton,
+    QWidget,
+)
+
+
+class OpenFolderDialog(QDialog):
+    """Dialog to choose a folder, a file name pattern and whether subfolders are searched."""
+
+    def __init__(self, parent: None | QWidget = None) -> None:
+        """Dialog to choose a folder, a file name pattern and whether subfolders are searched."""
+        super().__init__(parent)
+        self.setWindowTitle("Open Folder")
+        self.setMinimumWidth(500)
+
+        settings = QSettings()
+        folder = pathlib.Path(
+            settings.value("paths/last_opened_folder_directory", defaultValue=os.path.expanduser("~"))
+        )
+        self.txt_folder = QLineEdit(str(folder.absolute()) if folder.absolute().exists() else os.path.expanduser("~"))
+        self.btn_browse = QPushButton("...")
+        self.btn_browse.clicked.connect(self._handle_browse)
+        self.txt_pattern = QLineEdit(settings.value("open_folder/pattern", defaultValue="*"))
+        self.txt_pattern.setToolTip("Glob pattern of the file names, e.g. '*.h5'")
+        self.chk_recursive = QCheckBox("Include subfolders")
+        self.chk_recursive.setChecked(settings.value("open_folder/recursive", defaultValue=False, type=bool))
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+
+        lyt_folder = QHBoxLayout()
+        lyt_folder.addWidget(self.txt_folder)
+        lyt_folder.addWidget(self.btn_browse)
+        lyt_total = QFormLayout()
+        lyt_total.addRow("Folder", lyt_folder)
+        lyt_total.addRow("File names", self.txt_pattern)
+        lyt_total.addRow("", self.chk_recursive)
+        lyt_total.addRow(buttons)
+        self.setLayout(lyt_total)
+
+    @property
+    def folder(self) -> pathlib.Path:
+        """Chosen folder."""
+        return pathlib.Path(self.txt_folder.text())
+
+    @property
+    def pattern(self) -> str:
+        """Chosen glob pattern, '*' if empty."""
+        return self.txt_pattern.text().strip() or "*"
+
+    @property
+    def recursive(self) -> bool:
+        """Check if subfolders are searched."""
+        return self.chk_recursive.isChecked()
+
+    @pyqtSlot()
+    def _handle_browse(self) -> None:
+        """Choose folder with a file dialog."""
+        folder_path = QFileDialog.getExistingDirectory(self, "Open Folder", self.txt_folder.text())
+        if folder_path:
+            self.txt_folder.setText(folder_path)
+
+    def accept(self) -> None:
+        """Remember choices for the next time."""
+        settings = QSettings()
+        settings.setValue("paths/last_opened_folder_directory", self.folder)
+        settings.setValue("open_folder/pattern", self.pattern)
+        settings.setValue("open_folder/recursive", self.recursive)
+        super().accept()
@@ -0,0 +1,653 @@
+"""Plot widgets that read their data from file on demand."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import math
+import pathlib
+from typing import Any, Callable
+
+import h5py
+import pyqtgraph as pg
+from PyQt6.QtCore import QRectF, Qt, QThreadPool, QTimer, pyqtSlot
+from PyQt6.QtWidgets import (
+    QComboBox,
+    QFormLayout,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QSlider,
+    QStackedWidget,
+    QTableView,
+    QTextBrowser,
+    QVBoxLayout,
+    QWidget,
+)
+
+from src.gui.table_model import H5DatasetTable
+from src.gui.workers import EnvelopeLoader, FrameLoader, TileLoader
+from src.lib_h5.dataset_types import H5DatasetType
+from src.lib_h5.decimate import Envelope
+from src.lib_h5.file_pool import H5FilePool
+from src.lib_h5.preview import PAGE_ROWS, dataset_page, dataset_summary, group_page, row_count
+from src.lib_h5.pyramid import ImagePyramid
+from src.lib_h5.slicing import Frame, FrameCache, frame_index
+
+# Time to wait after the last zoom or pan before the visible range is read
+RANGE_UPDATE_DELAY_MS = 150
+
+
+class CurvePlotWidget(pg.PlotWidget):
+    """Plot of a 1D dataset that was read completely."""
+
+    def __init__(self) -> None:
+        """Plot of a 1D dataset that was read completely."""
+        super().__init__()
+        self._curve = self.plot()
+
+    def set_data(self, _file_path: pathlib.Path, _obj_path: str, data: Any) -> None:
+        """Replace the data of the curve."""
+        self._curve.setData(data)
+        self.enableAutoRange()
+
+    def clear_data(self) -> None:
+        """Drop the shown data."""
+        self._curve.setData([])
+
+
+class DecimatedPlotWidget(pg.PlotWidget):
+    """
+    Plot of a long 1D dataset.
+
+    The whole dataset is shown as min/max envelope. When zooming in, only the visible range is read again with one
+    bin per pixel, or at full resolution once there are fewer samples than pixels.
+    """
+
+    def __init__(self, file_pool: H5FilePool, thread_pool: QThreadPool) -> None:
+        """Plot of a long 1D dataset."""
+        super().__init__()
+        self._file_pool = file_pool
+        self._thread_pool = thread_pool
+        self._file_path = pathlib.Path()
+        self._obj_path = ""
+        self._overview: None | Envelope = None
+        self._shown = (0, 0, 0)
+        self._loader: None | EnvelopeLoader = None
+        self._request = 0
+
+        self._curve = self.plot()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(RANGE_UPDATE_DELAY_MS)
+        self._timer.timeout.connect(self._update_range)
+        self.sigXRangeChanged.connect(self._timer.start)
+
+    def set_data(self, file_path: pathlib.Path, obj_path: str, overview: Envelope) -> None:
+        """Show the overview of a dataset. Reads of the previous dataset are cancelled."""
+        self.cancel()
+        self._file_path = file_path
+        self._obj_path = obj_path
+        self._overview = overview
+        self._shown = (overview.start, overview.stop, overview.step)
+        self._curve.setData(overview.x, overview.y)
+        self.enableAutoRange()
+
+    def clear_data(self) -> None:
+        """Cancel reads and drop the shown data."""
+        self.cancel()
+        self._overview = None
+        self._curve.setData([], [])
+
+    @pyqtSlot()
+    def _update_range(self) -> None:
+        """Read the visible range if the overview is too coarse for it."""
+        if self._overview is None:
+            return
+        (x_min, x_max), _ = self.getViewBox().viewRange()
+        start = max(0, math.floor(x_min))
+        stop = min(self._overview.length, math.ceil(x_max) + 1)
+        if stop <= start:
+            return
+        n_bins = max(100, self.width())
+
+        # the overview has enough bins for every pixel
+        if (stop - start) / self._overview.step >= n_bins:
+            self._show(self._overview)
+            return
+        # the shown data already covers the visible range at the same resolution
+        shown_start, shown_stop, shown_step = self._shown
+        if shown_start <= start and stop <= shown_stop and shown_step <= max(1, (stop - start) // n_bins):
+            return
+
+        if self._loader is not None:
+            self._loader.cancel()
+        self._request += 1
+        # read a bit more than visible, so that small pans do not trigger a new read
+        margin = (stop - start) // 2
+        self._loader = EnvelopeLoader(
+            self._request,
+            self._file_pool,
+            self._file_path,
+            self._obj_path,
+            max(0, start - margin),
+            min(self._overview.length, stop + margin),
+            2 * n_bins,
+        )
+        self._loader.signals.finished.connect(self._handle_envelope)
+        self._thread_pool.start(self._loader)
+
+    @pyqtSlot(int, object, object)
+    def _handle_envelope(self, request_id: int, _: H5DatasetType, envelope: Envelope) -> None:
+        if request_id != self._request or self._overview is None:
+            return
+        self._loader = None
+        self._show(envelope)
+
+    def _show(self, envelope: Envelope) -> None:
+        if self._shown == (envelope.start, envelope.stop, envelope.step):
+            return
+        self._shown = (envelope.start, envelope.stop, envelope.step)
+        self._curve.setData(envelope.x, envelope.y)
+
+    def cancel(self) -> None:
+        """Cancel running reads, their results are dropped."""
+        self._timer.stop()
+        self._request += 1
+        if self._loader is not None:
+            self._loader.cancel()
+            self._loader = None
+
+
+class ImageWidget(pg.ImageView):
+    """Image View of an image that was read completely."""
+
+    def __init__(self, colormap: pg.ColorMap) -> None:
+        """Image View of an image that was read completely."""
+        super().__init__()
+        self.setColorMap(colormap)
+
+    def set_data(self, _file_path: pathlib.Path, _obj_path: str, data: Any) -> None:
+        """Replace the image. Zoom and pan are kept if the new image has the same shape."""
+        same_shape = self.image is not None and self.image.shape == data.shape
+        self.setImage(data, autoLevels=True, autoRange=not same_shape)
+
+    def set_levels(self, levels: tuple[float, float]) -> None:
+        """Use levels computed from the statistics of the dataset."""
+        self.setLevels(*levels)
+
+    def clear_data(self) -> None:
+        """Drop the shown image."""
+        self.clear()
+
+
+class PyramidImageView(pg.ImageView):
+    """
+    Image View of a large image.
+
+    The overview level of the pyramid is shown scaled to full resolution coordinates. When zooming in, the tiles of the
+    finer level that intersect the view are read and shown on top of it.
+    """
+
+    def __init__(self, file_pool: H5FilePool, thread_pool: QThreadPool, colormap: pg.ColorMap) -> None:
+        """Image View of a large image."""
+        super().__init__()
+        self._file_pool = file_pool
+        self._thread_pool = thread_pool
+        self._file_path = pathlib.Path()
+        self._obj_path = ""
+        self._pyramid: None | ImagePyramid = None
+        self._loader: None | TileLoader = None
+        self._request = 0
+
+        self.setColorMap(colormap)
+        self._detail = pg.ImageItem()
+        self._detail.setZValue(self.imageItem.zValue() + 1)
+        self._detail.hide()
+        self.getView().addItem(self._detail)
+
+        histogram = self.getHistogramWidget().item
+        histogram.sigLevelsChanged.connect(self._sync_detail_levels)
+        histogram.sigLookupTableChanged.connect(self._sync_detail_levels)
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(RANGE_UPDATE_DELAY_MS)
+        self._timer.timeout.connect(self._update_detail)
+        self.getView().sigRangeChanged.connect(self._timer.start)
+
+    def set_data(self, file_path: pathlib.Path, obj_path: str, pyramid: ImagePyramid) -> None:
+        """Show the overview of an image. Reads of the previous image are cancelled."""
+        self.cancel()
+        self._file_path = file_path
+        self._obj_path = obj_path
+        self._pyramid = pyramid
+        self._detail.hide()
+        self._detail.clear()
+        factor = pyramid.overview_factor
+        self.setImage(pyramid.overview, scale=(factor, factor))
+
+    def set_levels(self, levels: tuple[float, float]) -> None:
+        """Use levels computed from the statistics of the dataset, also for the detail tiles."""
+        self.setLevels(*levels)
+
+    def clear_data(self) -> None:
+        """Cancel reads and drop the shown image."""
+        self.cancel()
+        self._pyramid = None
+        self._detail.hide()
+        self._detail.clear()
+        self.clear()
+
+    @pyqtSlot()
+    def _update_detail(self) -> None:
+        """Read the visible tiles of the level that matches the zoom."""
+        if self._pyramid is None:
+            return
+        view = self.getView()
+        pixel_size = min(view.viewPixelSize())
+        factor = self._pyramid.level_factor(pixel_size)
+        if factor >= self._pyramid.overview_factor:
+            self._detail.hide()
+            return
+
+        (x_min, x_max), (y_min, y_max) = view.viewRange()
+        rows = (max(0, math.floor(x_min)), min(self._pyramid.shape[0], math.ceil(x_max)))
+        cols = (max(0, math.floor(y_min)), min(self._pyramid.shape[1], math.ceil(y_max)))
+        if rows[1] <= rows[0] or cols[1] <= cols[0]:
+            return
+
+        if self._loader is not None:
+            self._loader.cancel()
+        self._request += 1
+        self._loader = TileLoader(
+            self._request, self._file_pool, self._file_path, self._obj_path, self._pyramid, factor, rows, cols
+        )
+        self._loader.signals.finished.connect(self._handle_tiles)
+        self._thread_pool.start(self._loader)
+
+    @pyqtSlot(int, object, object)
+    def _handle_tiles(self, request_id: int, _: Any, region: tuple[Any, tuple[int, int], int]) -> None:
+        if request_id != self._request or self._pyramid is None:
+            return
+        self._loader = None
+        mosaic, (row, col), factor = region
+        self._detail.setImage(mosaic, autoLevels=False)
+        self._detail.setRect(QRectF(row, col, mosaic.shape[0] * factor, mosaic.shape[1] * factor))
+        self._sync_detail_levels()
+        self._detail.show()
+
+    @pyqtSlot()
+    def _sync_detail_levels(self) -> None:
+        """Use levels and colors of the overview for the detail tiles."""
+        if (levels := self.imageItem.getLevels()) is not None:
+            self._detail.setLevels(levels)
+        self._detail.setLookupTable(self.imageItem.lut)
+
+    def cancel(self) -> None:
+        """Cancel running reads, their results are dropped."""
+        self._timer.stop()
+        self._request += 1
+        if self._loader is not None:
+            self._loader.cancel()
+            self._loader = None
+
+
+class TextPreview(QWidget):
+    """
+    Text of a dataset or group that is read page by page.
+
+    Datasets start with a summary of the start and end of every axis, groups with the first page of member names.
+    """
+
+    def __init__(self, file_pool: H5FilePool) -> None:
+        """Text of a dataset or group that is read page by page."""
+        super().__init__()
+        self._file_pool = file_pool
+        self._file_path = pathlib.Path()
+        self._obj_path = ""
+        self._is_group = False
+        self._rows = 0
+        # -1 is the summary of a dataset
+        self._start = -1
+
+        self.text_browser = QTextBrowser()
+        self.text_browser.setLineWrapMode(QTextBrowser.LineWrapMode.NoWrap)
+        self.btn_summary = QPushButton("Summary")
+        self.btn_summary.clicked.connect(lambda: self._show_page(-1))
+        self.btn_prev = QPushButton("<")
+        self.btn_prev.clicked.connect(lambda: self._show_page(max(0, self._start - PAGE_ROWS)))
+        self.btn_next = QPushButton(">")
+        self.btn_next.clicked.connect(lambda: self._show_page(0 if self._start < 0 else self._start + PAGE_ROWS))
+        self.lbl_page = QLabel()
+
+        lyt_buttons = QHBoxLayout()
+        lyt_buttons.addWidget(self.btn_summary)
+        lyt_buttons.addWidget(self.btn_prev)
+        lyt_buttons.addWidget(self.btn_next)
+        lyt_buttons.addWidget(self.lbl_page)
+        lyt_buttons.addStretch()
+        lyt_total = QVBoxLayout()
+        lyt_total.addWidget(self.text_browser)
+        lyt_total.addLayout(lyt_buttons)
+        self.setLayout(lyt_total)
+        self._update_buttons()
+
+    def set_data(self, file_path: pathlib.Path, obj_path: str, text: str) -> None:
+        """Show the first page or the summary of an object."""
+        self._file_path = file_path
+        self._obj_path = obj_path
+        with self._file_pool.lease(file_path) as file:
+            h5_obj = file[obj_path]
+            self._is_group = isinstance(h5_obj, h5py.Group)
+            self._rows = row_count(h5_obj)
+        self._start = 0 if self._is_group else -1
+        self.text_browser.setText(text)
+        self.btn_summary.setVisible(not self._is_group)
+        self._update_buttons()
+
+    def clear_data(self) -> None:
+        """Drop the shown text."""
+        self.text_browser.clear()
+
+    def _show_page(self, start: int) -> None:
+        """Read and show the page starting at row start, or the summary for -1."""
+        try:
+            with self._file_pool.lease(self._file_path) as file:
+                h5_obj = file[self._obj_path]
+                if start < 0:
+                    text = dataset_summary(h5_obj)
+                elif self._is_group:
+                    text = group_page(h5_obj, start)
+                else:
+                    text = dataset_page(h5_obj, start)
+            self.text_browser.setText(text)
+        except (OSError, KeyError) as err:
+            self.text_browser.setText(f"Failed to read '{self._obj_path}'. Error: '{err}'")
+            return
+        self._start = start
+        self._update_buttons()
+
+    def _update_buttons(self) -> None:
+        paged = self._rows > 1
+        self.btn_prev.setVisible(paged)
+        self.btn_next.setVisible(paged)
+        self.lbl_page.setVisible(paged)
+        self.btn_prev.setEnabled(self._start > 0)
+        self.btn_next.setEnabled(self._start < 0 or self._start + PAGE_ROWS < self._rows)
+        if self._start < 0:
+            self.lbl_page.setText(f"{self._rows} rows")
+        else:
+            self.lbl_page.setText(
+                f"rows {self._start} to {min(self._start + PAGE_ROWS, self._rows) - 1} of {self._rows}"
+            )
+
+
+class SliceNavigator(QWidget):
+    """
+    Image of one frame of a dataset with more than two dimensions.
+
+    Two axes are shown as image, all other axes are scrubbed with sliders. Every frame is read with one hyperslab
+    together with the frames that share its chunks, and the next frames in the direction of scrubbing are prefetched.
+    Levels are only set automatically for the first frame, so that frames can be compared while scrubbing. Levels
+    from the statistics of the whole dataset replace them.
+    """
+
+    def __init__(self, file_pool: H5FilePool, thread_pool: QThreadPool, colormap: pg.ColorMap) -> None:
+        """Image of one frame of a dataset with more than two dimensions."""
+        super().__init__()
+        self._file_pool = file_pool
+        self._thread_pool = thread_pool
+        self._file_path = pathlib.Path()
+        self._obj_path = ""
+        self._shape: tuple[int, ...] = ()
+        self._display_axes = (0, 1)
+        self._index: tuple[int, ...] = ()
+        self._frame_cache = FrameCache()
+        self._auto_levels = True
+        self._levels: None | tuple[float, float] = None
+        self._loader: None | FrameLoader = None
+        self._request = 0
+
+        self.image_view = pg.ImageView()
+        self.image_view.setColorMap(colormap)
+        self.cb_axis_x = QComboBox()
+        self.cb_axis_x.currentIndexChanged.connect(lambda axis: self._set_display_axis(0, axis))
+        self.cb_axis_y = QComboBox()
+        self.cb_axis_y.currentIndexChanged.connect(lambda axis: self._set_display_axis(1, axis))
+        self.sliders: list[QSlider] = []
+        self.lbl_index: list[QLabel] = []
+
+        lyt_axes = QHBoxLayout()
+        lyt_axes.addWidget(QLabel("Show"))
+        lyt_axes.addWidget(self.cb_axis_x)
+        lyt_axes.addWidget(QLabel("against"))
+        lyt_axes.addWidget(self.cb_axis_y)
+        lyt_axes.addStretch()
+        self.lyt_sliders = QFormLayout()
+        lyt_total = QVBoxLayout()
+        lyt_total.addWidget(self.image_view)
+        lyt_total.addLayout(lyt_axes)
+        lyt_total.addLayout(self.lyt_sliders)
+        self.setLayout(lyt_total)
+
+    def set_data(self, file_path: pathlib.Path, obj_path: str, frames: list[Frame]) -> None:
+        """Show the first frame of a dataset, the other frames were read with it."""
+        self.cancel()
+        # a new cache, so that loaders of the previous dataset that are still reading can not add frames to it
+        self._frame_cache.clear()
+        self._frame_cache = FrameCache()
+        self._file_path = file_path
+        self._obj_path = obj_path
+        with self._file_pool.lease(file_path) as file:
+            self._shape = tuple(file[obj_path].shape)
+        self._display_axes = frames[0].display_axes
+        self._index = frames[0].position
+        for frame in frames:
+            self._frame_cache.put(frame)
+
+        axis_names = [f"axis {axis} ({n})" for axis, n in enumerate(self._shape)]
+        for combo_box, axis in ((self.cb_axis_x, self._display_axes[0]), (self.cb_axis_y, self._display_axes[1])):
+            combo_box.blockSignals(True)
+            combo_box.clear()
+            combo_box.addItems(axis_names)
+            combo_box.setCurrentIndex(axis)
+            combo_box.blockSignals(False)
+
+        while self.lyt_sliders.rowCount():
+            self.lyt_sliders.removeRow(0)
+        self.sliders = []
+        self.lbl_index = []
+        for axis, n in enumerate(self._shape):
+            slider = QSlider(Qt.Orientation.Horizontal)
+            slider.setRange(0, n - 1)
+            slider.setValue(self._index[axis])
+            slider.valueChanged.connect(lambda value, axis=axis: self._set_index(axis, value))
+            label = QLabel()
+            lyt_slider = QHBoxLayout()
+            lyt_slider.addWidget(slider)
+            lyt_slider.addWidget(label)
+            self.lyt_sliders.addRow(f"axis {axis}", lyt_slider)
+            self.sliders.append(slider)
+            self.lbl_index.append(label)
+        self._update_sliders()
+
+        self._auto_levels = True
+        self._levels = None
+        self._show(frames[0])
+
+    def set_levels(self, levels: tuple[float, float]) -> None:
+        """Use levels computed from the statistics of the dataset for all frames."""
+        self._levels = levels
+        self.image_view.setLevels(*levels)
+
+    def clear_data(self) -> None:
+        """Cancel reads and drop all frames."""
+        self.cancel()
+        self._frame_cache.clear()
+        self.image_view.clear()
+
+    def _set_display_axis(self, position: int, axis: int) -> None:
+        """Show axis as x (position 0) or y (position 1) axis. If it already is the other one, the axes are swapped."""
+        if axis < 0 or axis == self._display_axes[position]:
+            return
+        display_axes = list(self._display_axes)
+        if display_axes[1 - position] == axis:
+            display_axes[1 - position] = display_axes[position]
+        display_axes[position] = axis
+        self._display_axes = (display_axes[0], display_axes[1])
+        for combo_box, shown_axis in zip((self.cb_axis_x, self.cb_axis_y), self._display_axes):
+            combo_box.blockSignals(True)
+            combo_box.setCurrentIndex(shown_axis)
+            combo_box.blockSignals(False)
+        self._update_sliders()
+        self._auto_levels = True
+        self._request_frame(None)
+
+    def _set_index(self, axis: int, value: int) -> None:
+        if value == self._index[axis]:
+            return
+        direction = 1 if value > self._index[axis] else -1
+        index = list(self._index)
+        index[axis] = value
+        self._index = tuple(index)
+        self._update_sliders()
+        self._request_frame((axis, direction))
+
+    def _update_sliders(self) -> None:
+        for axis, (slider, label) in enumerate(zip(self.sliders, self.lbl_index)):
+            shown = axis in self._display_axes
+            slider.setEnabled(not shown)
+            label.setText("shown" if shown else f"{self._index[axis]} / {self._shape[axis] - 1}")
+
+    def _request_frame(self, step: None | tuple[int, int]) -> None:
+        """Show the frame at the current index. Cached frames are shown at once, others are read in the background."""
+        if (frame := self._frame_cache.get(self._display_axes, self._index)) is not None:
+            self._show(frame)
+        self.cancel()
+        # also started for cached frames, so that the frames ahead are prefetched
+        self._loader = FrameLoader(
+            self._request,
+            self._file_pool,
+            self._file_path,
+            self._obj_path,
+            self._frame_cache,
+            self._display_axes,
+            self._index,
+            step,
+        )
+        self._loader.signals.finished.connect(self._handle_frame)
+        self._thread_pool.start(self._loader)
+
+    @pyqtSlot(int, object, object)
+    def _handle_frame(self, request_id: int, _: H5DatasetType, frame: Frame) -> None:
+        if request_id == self._request:
+            self._show(frame)
+
+    def _show(self, frame: Frame) -> None:
+        if frame.display_axes != self._display_axes or frame.position != frame_index(self._index, self._display_axes):
+            return
+        if self.image_view.image is frame.image:
+            return
+        auto_levels = self._auto_levels and self._levels is None
+        self.image_view.setImage(frame.image, autoLevels=auto_levels, autoRange=self._auto_levels)
+        self._auto_levels = False
+
+    def cancel(self) -> None:
+        """Cancel running reads, their results are dropped."""
+        self._request += 1
+        if self._loader is not None:
+            self._loader.cancel()
+            self._loader = None
+
+
+class DatasetTableView(QTableView):
+    """Table of a dataset whose rows are read when they are shown."""
+
+    def __init__(self, file_pool: H5FilePool) -> None:
+        """Table of a dataset whose rows are read when they are shown."""
+        super().__init__()
+        self._file_pool = file_pool
+
+    def set_data(self, file_path: pathlib.Path, obj_path: str, _: Any) -> None:
+        """Show another dataset."""
+        self._set_model(H5DatasetTable(self._file_pool, file_path, obj_path))
+
+    def clear_data(self) -> None:
+        """Drop the model and its cached rows."""
+        self._set_model(None)
+
+    def _set_model(self, model: None | H5DatasetTable) -> None:
+        old_model = self.model()
+        self.setModel(model)
+        if old_model is not None:
+            old_model.deleteLater()
+
+
+class PlotWidgetManager(QStackedWidget):
+    """
+    Data view that keeps one widget per kind of plot.
+
+    Widgets are created when their kind is shown the first time and then only get new data, so stepping through
+    datasets of the same kind only costs the data transfer. A widget drops its data when another kind is shown.
+    """
+
+    def __init__(self, file_pool: H5FilePool, thread_pool: QThreadPool) -> None:
+        """Create a data view that keeps one widget per kind of plot."""
+        super().__init__()
+        colormap = pg.colormap.get("inferno")
+        self._factories: dict[type[QWidget], Callable[[], Any]] = {
+            CurvePlotWidget: CurvePlotWidget,
+            DecimatedPlotWidget: lambda: DecimatedPlotWidget(file_pool, thread_pool),
+            ImageWidget: lambda: ImageWidget(colormap),
+            PyramidImageView: lambda: PyramidImageView(file_pool, thread_pool, colormap),
+            SliceNavigator: lambda: SliceNavigator(file_pool, thread_pool, colormap),
+            DatasetTableView: lambda: DatasetTableView(file_pool),
+            TextPreview: lambda: TextPreview(file_pool),
+        }
+        self._widgets: dict[type[QWidget], Any] = {}
+        self._shown: Any = None
+        self._empty = QWidget()
+        self.addWidget(self._empty)
+
+    def show_data(self, kind: type[QWidget], file_path: pathlib.Path, obj_path: str, data: Any) -> None:
+        """
+        Show data of an object in the widget of a kind.
+
+        :param kind: class of the widget, one of the classes of this module
+        :param file_path: file of the object
+        :param obj_path: path of the object in the file
+        :param data: data prepared by a DatasetLoader
+        """
+        if (widget := self._widgets.get(kind)) is None:
+            widget = self._factories[kind]()
+            self._widgets[kind] = widget
+            self.addWidget(widget)
+        widget.set_data(file_path, obj_path, data)
+        self._set_current(widget)
+
+    def show_empty(self) -> None:
+        """Show nothing."""
+        self._set_current(self._empty)
+
+    def set_levels(self, levels: tuple[float, float]) -> None:
+        """Set the levels of the shown image, other widgets ignore them."""
+        if self._shown is not None and hasattr(self._shown, "set_levels"):
+            self._shown.set_levels(levels)
+
+    def _set_current(self, widget: Any) -> None:
+        if self._shown is not None and self._shown is not widget:
+            self._shown.clear_data()
+        self._shown = None if widget is self._empty else widget
+        self.setCurrentWidget(widget)
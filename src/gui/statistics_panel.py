@@ -0,0 +1,178 @@
+"""Statistics and histogram of the selected dataset."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import pathlib
+from typing import Any
+
+import h5py
+import pyqtgraph as pg
+from PyQt6.QtCore import QThreadPool, pyqtSignal, pyqtSlot
+from PyQt6.QtWidgets import QFormLayout, QLabel, QPushButton, QVBoxLayout, QWidget
+
+from src.gui.workers import StatisticsLoader
+from src.lib_h5.file_pool import H5FilePool
+from src.lib_h5.statistics import Statistics, StatisticsCache, has_statistics
+from src.lib_h5.structure_cache import file_identity
+
+# Statistics of datasets up to this size are computed when they are selected, larger ones on request
+AUTO_STATS_MAX_BYTES = 64 * 1024**2
+
+
+class StatisticsPanel(QWidget):
+    """
+    Statistics and histogram of the selected dataset.
+
+    They are computed in the background and updated while blocks are read. When they are complete, the levels of
+    their histogram are emitted, so that images of the dataset can use them.
+    """
+
+    levels_found = pyqtSignal(object)
+
+    def __init__(self, file_pool: H5FilePool, thread_pool: QThreadPool, statistics_cache: StatisticsCache) -> None:
+        """Statistics and histogram of the selected dataset."""
+        super().__init__()
+        self._file_pool = file_pool
+        self._thread_pool = thread_pool
+        self._statistics_cache = statistics_cache
+        self._file_path = pathlib.Path()
+        self._obj_path = ""
+        self._loader: None | StatisticsLoader = None
+        self._request = 0
+
+        self.lbl_status = QLabel()
+        self.btn_compute = QPushButton("Compute")
+        self.btn_compute.clicked.connect(self.compute)
+        self.labels = {name: QLabel() for name in ("Count", "NaN", "Infinite", "Min", "Max", "Mean", "Std")}
+        self.plot_histogram = pg.PlotWidget()
+        self.plot_histogram.setMinimumHeight(150)
+        self._bars = self.plot_histogram.plot(stepMode="center", fillLevel=0, brush=(100, 100, 200, 150))
+
+        lyt_values = QFormLayout()
+        lyt_values.addRow(self.lbl_status, self.btn_compute)
+        for name, label in self.labels.items():
+            lyt_values.addRow(name, label)
+        lyt_total = QVBoxLayout()
+        lyt_total.addLayout(lyt_values)
+        lyt_total.addWidget(self.plot_histogram)
+        self.setLayout(lyt_total)
+
+    def show_object(self, file_path: pathlib.Path, obj_path: str) -> None:
+        """
+        Show the statistics of an object.
+
+        Cached statistics are shown at once, statistics of small datasets are computed. Running computations of the
+        previous object are cancelled.
+
+        :param file_path: file of the object
+        :param obj_path: path of the object in the file
+        """
+        self.cancel()
+        self._file_path = file_path
+        self._obj_path = obj_path
+        self._show(None)
+        try:
+            with self._file_pool.lease(file_path) as file:
+                obj = file[obj_path]
+                nbytes = obj.nbytes if isinstance(obj, h5py.Dataset) and has_statistics(obj) else None
+        except (OSError, KeyError):
+            nbytes = None
+        if nbytes is None:
+            self.lbl_status.setText("No statistics for this object")
+            self.btn_compute.setEnabled(False)
+            return
+        if (stats := self._statistics_cache.get((file_identity(file_path), obj_path))) is not None:
+            self._handle_finished(self._request, None, stats)
+            return
+        self.lbl_status.setText("Not computed")
+        self.btn_compute.setEnabled(True)
+        if nbytes <= AUTO_STATS_MAX_BYTES:
+            self.compute()
+
+    @pyqtSlot()
+    def compute(self) -> None:
+        """Start computing the statistics of the shown dataset."""
+        self.cancel()
+        self.btn_compute.setEnabled(False)
+        self.lbl_status.setText("Computing")
+        self._loader = StatisticsLoader(
+            self._request, self._file_pool, self._statistics_cache, self._file_path, self._obj_path
+        )
+        self._loader.signals.progress.connect(self._handle_progress)
+        self._loader.signals.partial.connect(self._handle_partial)
+        self._loader.signals.finished.connect(self._handle_finished)
+        self._loader.signals.failed.connect(self._handle_failed)
+        self._thread_pool.start(self._loader)
+
+    def cancel(self) -> None:
+        """Cancel the running computation, its results are dropped."""
+        self._request += 1
+        if self._loader is not None:
+            self._loader.cancel()
+            self._loader = None
+
+    @pyqtSlot(int, int)
+    def _handle_progress(self, request_id: int, percent: int) -> None:
+        if request_id == self._request:
+            self.lbl_status.setText(f"Computing, {percent} %")
+
+    @pyqtSlot(int, object)
+    def _handle_partial(self, request_id: int, stats: Statistics) -> None:
+        if request_id == self._request:
+            self._show(stats)
+
+    @pyqtSlot(int, object, object)
+    def _handle_finished(self, request_id: int, _: Any, stats: Statistics) -> None:
+        if request_id != self._request:
+            return
+        self._loader = None
+        self.lbl_status.setText("Complete")
+        self.btn_compute.setEnabled(False)
+        self._show(stats)
+        if (levels := stats.levels()) is not None:
+            self.levels_found.emit(levels)
+
+    @pyqtSlot(int, str)
+    def _handle_failed(self, request_id: int, error: str) -> None:
+        if request_id != self._request:
+            return
+        self._loader = None
+        self.lbl_status.setText(f"Failed: {error}")
+        self.btn_compute.setEnabled(True)
+
+    def _show(self, stats: None | Statistics) -> None:
+        """Show values and histogram, or clear them."""
+        if stats is None:
+            for label in self.labels.values():
+                label.clear()
+            self._bars.setData([])
+            return
+        values = {
+            "Count": f"{stats.count:,}",
+            "NaN": f"{stats.nan_count:,}",
+            "Infinite": f"{stats.inf_count:,}",
+            "Min": f"{stats.min:.6g}" if stats.count else "",
+            "Max": f"{stats.max:.6g}" if stats.count else "",
+            "Mean": f"{stats.mean:.6g}" if stats.count else "",
+            "Std": f"{stats.std:.6g}" if stats.count else "",
+        }
+        for name, text in values.items():
+            self.labels[name].setText(text)
+        histogram = stats.histogram
+        if len(histogram.counts):
+            self._bars.setData(histogram.edges, histogram.counts)
+        else:
+            self._bars.setData([])
@@ -15,112 +15,319 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-from typing import Any
+import math
+import pathlib
+import sys
+from collections import OrderedDict
+from typing import Any, Callable
 
+import h5py
+import numpy as np
 import numpy.typing as npt
 from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
 
+from src.lib_h5.access import data_reader
+from src.lib_h5.file_pool import H5FilePool
 
-class TableModel(QAbstractTableModel):
-    """Table Model that can append and remove Rows."""
+# Maximum size of the data of one block of a dataset table, wide datasets are split into blocks of columns as well
+TABLE_BLOCK_BYTES = 256 * 1024
 
-    def __init__(self, header: list[str]) -> None:
-        """Table Model that can append and remove Rows."""
+# Rows of a block of a dataset whose rows are too wide for one block
+TABLE_TILE_ROWS = 64
+
+# Arrays with more elements are summarized until they are expanded
+ATTR_SUMMARY_ITEMS = 20
+
+# Summaries of attribute values are cut to this length
+ATTR_SUMMARY_LENGTH = 200
+
+# Expanded values are cut to this length, so that huge attributes do not block the table
+ATTR_FULL_LENGTH = 100_000
+
+
+def _format_cells(data: npt.NDArray) -> npt.NDArray:
+    """Format all cells of a block at once. Numbers are shown with all digits that tell them apart."""
+    if data.dtype.kind == "S":
+        return np.char.decode(data, errors="replace")
+    if data.dtype.kind == "O":
+        return np.array([e.decode(errors="replace") if isinstance(e, bytes) else str(e) for e in data.flat]).reshape(
+            data.shape
+        )
+    return data.astype(str)
+
+
+def _format_field(values: npt.NDArray) -> npt.NDArray:
+    """Format one column of a compound dataset. Array fields are joined into one cell per row."""
+    if values.ndim == 1:
+        return _format_cells(values)
+    cells = _format_cells(values.reshape(len(values), -1))
+    return np.array(["[" + ", ".join(row) + "]" for row in cells])
+
+
+class H5DatasetTable(QAbstractTableModel):
+    """
+    Table Model that reads blocks of a dataset when they are shown.
+
+    Blocks hold at most block_bytes of data, rows that are wider are split into blocks of columns. Formatted blocks are
+    kept in a LRU cache, so memory depends neither on the number of rows nor on the number of columns. Fields of
+    compound datasets are shown as columns, all axes after the first one are flattened into columns.
+    """
+
+    def __init__(
+        self,
+        file_pool: H5FilePool,
+        file_path: pathlib.Path,
+        obj_path: str,
+        block_bytes: int = TABLE_BLOCK_BYTES,
+        max_blocks: int = 32,
+    ) -> None:
+        """Table Model that reads blocks of a dataset when they are shown."""
         QAbstractTableModel.__init__(self)
-        self._header = header
-        self._data: list[Any] = []
+        self._file_pool = file_pool
+        self._file_path = file_path
+        self._obj_path = obj_path
+        self._max_blocks = max_blocks
+        self._blocks: OrderedDict[tuple[int, ...], npt.NDArray] = OrderedDict()
+
+        with file_pool.lease_dataset(file_path, obj_path) as dataset:
+            shape = tuple(int(n) for n in dataset.shape) if dataset.ndim > 0 else (1,)
+            self._fields: None | tuple[str, ...] = dataset.dtype.names
+            itemsize = int(dataset.dtype.itemsize)
+        self._rows = shape[0]
+        # axes that are flattened into columns, blocks of columns are ranges along _axis of them
+        self._inner = shape[1:] if self._fields is None else ()
+        self._columns = len(self._fields) if self._fields is not None else math.prod(self._inner)
+        self._tiled = False
+        self._axis = 0
+        self._axis_width = 1
+        # shape of the axes after _axis, a block holds all of their elements
+        self._sub_shape: tuple[int, ...] = ()
+
+        row_bytes = max(1, itemsize * self._columns)
+        if not self._inner or block_bytes // row_bytes >= TABLE_TILE_ROWS:
+            self._block_rows = max(1, block_bytes // row_bytes)
+            return
+        self._tiled = True
+        self._block_rows = min(TABLE_TILE_ROWS, max(1, self._rows))
+        # the first axis whose sub-arrays fit into a block, as many of them as fit make up a block of columns
+        for axis, n in enumerate(self._inner):
+            below = axis + 1
+            self._axis = axis
+            self._sub_shape = self._inner[below:]
+            sub_bytes = self._block_rows * itemsize * math.prod(self._sub_shape)
+            if sub_bytes <= block_bytes:
+                self._axis_width = max(1, min(n, block_bytes // sub_bytes))
+                break
 
     def rowCount(self, parent: None | QModelIndex = None) -> int:
         """Get Row Count."""
-        return len(self._data)
+        return self._rows
 
     def columnCount(self, parent: None | QModelIndex = None) -> int:
         """Get Column Count."""
-        return len(self._header)
+        return self._columns
 
-    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
-        """Item Flags for Cell at Index."""
-        return Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled
-
-    def appendRow(self, new_data: list[Any]) -> bool:
-        """Append Row."""
-        self.beginInsertRows(QModelIndex(), self.rowCount(), self.rowCount())
-        self._data.append(new_data)
-        self.endInsertRows()
-        return True
-
-    def removeRow(self, row: int, parent: None | QModelIndex = None) -> bool:
-        """Remove Row."""
-        self.beginRemoveRows(QModelIndex(), row, row)
-        try:
-            self._data.pop(row)
-        except IndexError:
-            self.endRemoveRows()
-            return False
-        self.endRemoveRows()
-        return True
-
-    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
-        """Get Data, Alignment, Colors etc. depending on Role."""
-        if role == Qt.ItemDataRole.DisplayRole:
-            return self._data[index.row()][index.column()]
+    def _locate(self, row: int, column: int) -> tuple[tuple[int, ...], int, int]:
+        """Get the key of the block of a cell, and the row and column of the cell in the block."""
+        block_row, row = divmod(row, self._block_rows)
+        if not self._tiled:
+            return (block_row,), row, column
+        index = [int(i) for i in np.unravel_index(column, self._inner)]
+        block_column, position = divmod(index[self._axis], self._axis_width)
+        offset = position
+        below = self._axis + 1
+        for i, n in zip(index[below:], self._sub_shape):
+            offset = offset * n + i
+        return (block_row, *index[: self._axis], block_column), row, offset
 
-    def setData(self, index: QModelIndex, value: str, role: int = Qt.ItemDataRole.EditRole) -> bool:
-        """Set Data when Cell is edited."""
-        if role != Qt.ItemDataRole.EditRole:
-            return False
+    def _block(self, key: tuple[int, ...]) -> npt.NDArray:
+        """Get formatted block from cache or file."""
+        if key in self._blocks:
+            self._blocks.move_to_end(key)
+            return self._blocks[key]
 
-        self._data[index.row()][index.column()] = value
-        self.dataChanged.emit(index, index)
-        return True
-
-    def getData(self, index: Any = None) -> Any:
-        """Get Data at Index or Row."""
-        if index is None:
-            return self._data
-        elif isinstance(index, QModelIndex):
-            return self._data[index.row()][index.column()]
-        elif isinstance(index, int):
-            return self._data[index]
-
-    def resetData(self) -> None:
-        """Reset to Empty Table."""
-        for i in range(self.rowCount()):
-            self.removeRow(0)
+        with self._file_pool.lease_dataset(self._file_path, self._obj_path) as dataset:
+            if dataset.ndim == 0:
+                data = np.asarray(dataset[()]).reshape(1)
+            else:
+                start = key[0] * self._block_rows
+                selection: tuple[int | slice, ...] = (slice(start, start + self._block_rows),)
+                if self._tiled:
+                    first = key[-1] * self._axis_width
+                    selection += (*key[1:-1], slice(first, first + self._axis_width))
+                data = np.asarray(data_reader(dataset)[selection])
+        if self._fields is not None:
+            cells = np.column_stack([_format_field(data[field]) for field in self._fields])
+        else:
+            cells = _format_cells(data.reshape(len(data), -1))
+
+        self._blocks[key] = cells
+        while len(self._blocks) > self._max_blocks:
+            self._blocks.popitem(last=False)
+        return cells
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> None | str:
+        """Get Data, Alignment, Colors etc. depending on Role."""
+        if role == Qt.ItemDataRole.DisplayRole:
+            key, row, column = self._locate(index.row(), index.column())
+            return str(self._block(key)[row, column])
+        return None
 
     def headerData(
         self,
         section: int,
         orientation: Qt.Orientation,
         role: int = Qt.ItemDataRole.DisplayRole,
-    ) -> None | str | int:
-        """Get Headers for horizontal | vertical Orientation."""
-        if role == Qt.ItemDataRole.DisplayRole:
-            if orientation == Qt.Orientation.Horizontal:
-                return self._header[section]
-            if orientation == Qt.Orientation.Vertical:
-                return section + 1
-        return None
+    ) -> Any:
+        """Get field names as horizontal Headers of compound datasets."""
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal and self._fields:
+            return self._fields[section]
+        return super().headerData(section, orientation, role)
+
+
+def _format_attr(value: Any, full: bool) -> tuple[str, bool]:
+    """
+    Format attribute value. Arrays are summarized and long values cut, unless full is set.
+
+    :return: text and whether it is shorter than the full value
+    """
+    summarized = False
+    if isinstance(value, bytes):
+        value = value.decode(errors="replace")
+    if isinstance(value, np.ndarray) and value.ndim > 0:
+        summarized = not full and value.size > ATTR_SUMMARY_ITEMS
+        text = np.array2string(
+            value,
+            threshold=sys.maxsize if full else ATTR_SUMMARY_ITEMS,
+            edgeitems=3,
+            max_line_width=sys.maxsize,
+        )
+    else:
+        text = str(value)
+    max_length = ATTR_FULL_LENGTH if full else ATTR_SUMMARY_LENGTH
+    if len(text) > max_length:
+        return text[: max_length - 3] + "...", not full
+    return text, summarized
+
+
+def _attr_type(attr_id: h5py.h5a.AttrID) -> str:
+    """Describe type and shape of an attribute from its metadata, its value is not read."""
+    dtype = attr_id.dtype
+    type_name = "string" if h5py.check_string_dtype(dtype) is not None else str(dtype)
+    if attr_id.shape is None:
+        return f"{type_name} empty"
+    return type_name if attr_id.shape == () else f"{type_name} {attr_id.shape}"
+
 
+class H5AttributeTable(QAbstractTableModel):
+    """
+    Table Model of the attributes of an object, after some rows of general information.
 
-class DataTable(QAbstractTableModel):
-    """Table Model for 2D Numpy Arrays."""
+    Only attribute names are listed when an object is shown. Type and shape are read from the attribute metadata and
+    values are read and formatted when their row is drawn the first time. Large values are summarized and can be
+    expanded row by row.
+    """
 
-    def __init__(self, data: npt.NDArray) -> None:
-        """Table Model for 2D Numpy Arrays."""
+    def __init__(self, file_pool: H5FilePool) -> None:
+        """Table Model of the attributes of an object, after some rows of general information."""
         QAbstractTableModel.__init__(self)
-        self._data = data
+        self._file_pool = file_pool
+        self._header = ["Attribute", "Value", "Type"]
+        self._file_path = pathlib.Path()
+        self._obj_path = ""
+        self._info: list[tuple[str, str]] = []
+        self._names: list[str] = []
+        self._types: dict[int, str] = {}
+        self._values: dict[int, tuple[str, bool]] = {}
+        self._expanded: set[int] = set()
+
+    def show_object(self, file_path: pathlib.Path, obj_path: str, info: list[tuple[str, str]]) -> None:
+        """Show info rows and the attributes of an object, or only the info rows for an empty obj_path."""
+        self.beginResetModel()
+        self._file_path = file_path
+        self._obj_path = obj_path
+        self._info = info
+        self._names = self._read_attrs(list) if obj_path else []
+        self._types = {}
+        self._values = {}
+        self._expanded = set()
+        self.endResetModel()
+
+    def clear(self) -> None:
+        """Remove all rows."""
+        self.show_object(pathlib.Path(), "", [])
+
+    def _read_attrs(self, read: Callable[[h5py.AttributeManager], Any]) -> Any:
+        """Call read with the attributes of the shown object, while its file is leased."""
+        with self._file_pool.lease(self._file_path) as file:
+            return read(file[self._obj_path].attrs)
+
+    def _value(self, row: int) -> tuple[str, bool]:
+        """Get the formatted value of an attribute row and whether it was cut."""
+        if row not in self._values:
+            try:
+                value = self._read_attrs(lambda attrs: attrs[self._names[row]])
+                self._values[row] = _format_attr(value, row in self._expanded)
+            except (OSError, KeyError, TypeError) as err:
+                self._values[row] = f"<unreadable: {err}>", False
+        return self._values[row]
+
+    def _type(self, row: int) -> str:
+        """Get type and shape of an attribute row without reading its value."""
+        if row not in self._types:
+            try:
+                self._types[row] = self._read_attrs(lambda attrs: _attr_type(attrs.get_id(self._names[row])))
+            except (OSError, KeyError) as err:
+                self._types[row] = f"<unreadable: {err}>"
+        return self._types[row]
+
+    def expand(self, row: int) -> None:
+        """Show the full value of an attribute row."""
+        row -= len(self._info)
+        if not 0 <= row < len(self._names) or row in self._expanded:
+            return
+        self._expanded.add(row)
+        self._values.pop(row, None)
+        index = self.index(row + len(self._info), 1)
+        self.dataChanged.emit(index, index)
 
     def rowCount(self, parent: None | QModelIndex = None) -> int:
         """Get Row Count."""
-        return int(self._data.shape[0])
+        return len(self._info) + len(self._names)
 
     def columnCount(self, parent: None | QModelIndex = None) -> int:
         """Get Column Count."""
-        return int(self._data.shape[1])
+        return len(self._header)
 
-    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> None | float:
-        """Get Data, Alignment, Colors etc. depending on Role."""
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> None | str:
+        """Get Name and Value, values are read on first access."""
+        row = index.row()
+        if role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return None
+        if row < len(self._info):
+            if role != Qt.ItemDataRole.DisplayRole or index.column() >= len(self._info[row]):
+                return None
+            return self._info[row][index.column()]
+        row -= len(self._info)
+        if index.column() == 0:
+            return self._names[row] if role == Qt.ItemDataRole.DisplayRole else None
+        if index.column() == 2:
+            return self._type(row) if role == Qt.ItemDataRole.DisplayRole else None
+        text, summarized = self._value(row)
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return "Double-click to show the full value" if summarized else None
+        return text
+
+    def headerData(
+        self,
+        section: int,
+        orientation: Qt.Orientation,
+        role: int = Qt.ItemDataRole.DisplayRole,
+    ) -> None | str | int:
+        """Get Headers for horizontal | vertical Orientation."""
         if role == Qt.ItemDataRole.DisplayRole:
-            return float(self._data[index.row()][index.column()])
+            if orientation == Qt.Orientation.Horizontal:
+                return self._header[section]
+            if orientation == Qt.Orientation.Vertical:
+                return section + 1
         return None
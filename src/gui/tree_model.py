@@ -0,0 +1,367 @@
+"""Lazy tree model of opened HDF5 files."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import itertools
+import pathlib
+from array import array
+from typing import Any, Iterator
+
+from PyQt6.QtCore import QAbstractItemModel, QModelIndex, QObject, QSortFilterProxyModel, Qt
+from PyQt6.QtGui import QIcon
+
+from src.lib_h5.file_pool import H5FilePool
+from src.lib_h5.metadata import NodeMeta
+from src.lib_h5.node_table import NodeKind, NodeTable
+from src.lib_h5.recursive_iterator import group_children
+from src.lib_h5.search_index import FileSearchIndex, SearchQuery
+
+_NODE_BITS = 32
+_NODE_MASK = (1 << _NODE_BITS) - 1
+
+
+class H5TreeModel(QAbstractItemModel):
+    """
+    Tree Model of HDF5 Files that reads the children of a group only when it is expanded.
+
+    Every file is stored in its own NodeTable. The internal id of an index encodes the slot of the table and the node
+    inside of it, so no Python object is created per row.
+    """
+
+    def __init__(self, icon_dir: pathlib.Path, file_pool: H5FilePool, parent: None | QObject = None) -> None:
+        """Tree Model of HDF5 Files that reads the children of a group only when it is expanded."""
+        super().__init__(parent)
+        self._file_pool = file_pool
+        self._header = ["Name", "Type"]
+        self._tables: dict[int, NodeTable] = {}
+        # metadata of all objects by path, only known for files that have been indexed completely
+        self._metadata: dict[int, dict[str, NodeMeta]] = {}
+        # built on the first search, files that are still being indexed get a new one when they grew
+        self._search_indexes: dict[int, FileSearchIndex] = {}
+        self._files: list[int] = []
+        self._next_slot = 0
+        # node of the table for every node id of a running TreeIndexer, -1 for nodes that could not be matched
+        self._index_maps: dict[int, array[int]] = {}
+        self._index_counts: dict[int, int] = {}
+        self._icons = {
+            NodeKind.File: QIcon(str(pathlib.Path(icon_dir, "file.svg"))),
+            NodeKind.Group: QIcon(str(pathlib.Path(icon_dir, "group.svg"))),
+            NodeKind.Dataset: QIcon(str(pathlib.Path(icon_dir, "dataset.svg"))),
+        }
+
+    # ----- File handling ----- #
+    @property
+    def file_paths(self) -> tuple[pathlib.Path, ...]:
+        """Paths of all opened files."""
+        return tuple(pathlib.Path(self._tables[slot].name(0)) for slot in self._files)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by all node tables."""
+        return sum(table.nbytes for table in self._tables.values())
+
+    def slot(self, row: int) -> int:
+        """Slot of the file in row."""
+        return self._files[row]
+
+    def add_file(self, file_path: pathlib.Path) -> int:
+        """
+        Append a file to the model. Only the children of the root group are read.
+
+        :return: slot of the file
+        :raises OSError: if the file can not be opened
+        """
+        table = NodeTable(str(file_path))
+        with self._file_pool.lease(file_path) as file:
+            table.add_children(0, group_children(file.id))
+        return self.add_table(table)
+
+    def add_table(self, table: NodeTable, metadata: None | dict[str, NodeMeta] = None) -> int:
+        """
+        Append a file whose tree has already been read, e.g. by read_tree in another process or from the cache.
+
+        :return: slot of the file
+        """
+        row = len(self._files)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._tables[self._next_slot] = table
+        if metadata is not None:
+            self._metadata[self._next_slot] = metadata
+        self._files.append(self._next_slot)
+        self._next_slot += 1
+        self.endInsertRows()
+        return self._next_slot - 1
+
+    def clear(self) -> None:
+        """Remove all files."""
+        self.beginResetModel()
+        self._tables = {}
+        self._metadata = {}
+        self._search_indexes = {}
+        self._files = []
+        self._index_maps = {}
+        self._index_counts = {}
+        self.endResetModel()
+
+    def removeRows(self, row: int, count: int, parent: QModelIndex = QModelIndex()) -> bool:
+        """Remove files. Only top level rows can be removed."""
+        if parent.isValid() or row < 0 or row + count > len(self._files):
+            return False
+        self.beginRemoveRows(parent, row, row + count - 1)
+        stop = row + count
+        for slot in self._files[row:stop]:
+            del self._tables[slot]
+            self._metadata.pop(slot, None)
+            self._search_indexes.pop(slot, None)
+            self._index_maps.pop(slot, None)
+            self._index_counts.pop(slot, None)
+        del self._files[row:stop]
+        self.endRemoveRows()
+        return True
+
+    def metadata(self, slot: int) -> None | dict[str, NodeMeta]:
+        """Metadata of all objects of the file in slot by path, None if the file has not been indexed yet."""
+        return self._metadata.get(slot)
+
+    def set_metadata(self, slot: int, metadata: dict[str, NodeMeta]) -> None:
+        """Store metadata of a file once it has been indexed."""
+        if slot in self._tables:
+            self._metadata[slot] = metadata
+            self._search_indexes.pop(slot, None)
+
+    def search(self, query: SearchQuery, limit: int, within: None | list[QModelIndex] = None) -> list[QModelIndex]:
+        """
+        Indexes of the first limit nodes of all files that match a query.
+
+        Files that have not been indexed completely are searched in the nodes read so far, by path only.
+
+        :param query: search query
+        :param limit: maximum number of matches
+        :param within: only search these nodes, e.g. the matches of a query that the new one refines
+        """
+        candidates: None | dict[int, list[int]] = None
+        if within is not None:
+            candidates = {}
+            for index in within:
+                candidates.setdefault(index.internalId() >> _NODE_BITS, []).append(index.internalId() & _NODE_MASK)
+
+        matches: list[QModelIndex] = []
+        for slot in self._files:
+            if candidates is not None and slot not in candidates:
+                continue
+            search_index = self._search_indexes.get(slot)
+            if search_index is None or search_index.size != len(self._tables[slot]):
+                search_index = FileSearchIndex(self._tables[slot], self._metadata.get(slot))
+                self._search_indexes[slot] = search_index
+            nodes = search_index.search(query, None if candidates is None else candidates[slot])
+            for node in itertools.islice(nodes, limit - len(matches)):
+                matches.append(self._node_index(slot, node))
+            if len(matches) >= limit:
+                break
+        return matches
+
+    # ----- Background indexing ----- #
+    def is_indexing(self, slot: int) -> bool:
+        """Check if a TreeIndexer is running for the file in slot."""
+        return slot in self._index_maps
+
+    def start_indexing(self, slot: int) -> None:
+        """Prepare merging the nodes of a TreeIndexer. Its node 0 is the file."""
+        self._index_maps[slot] = array("q", [0])
+        self._index_counts[slot] = 0
+        self._file_type_changed(slot)
+
+    def stop_indexing(self, slot: int) -> None:
+        """Forget the node ids of a finished or cancelled TreeIndexer."""
+        self._index_maps.pop(slot, None)
+        self._index_counts.pop(slot, None)
+        self._file_type_changed(slot)
+
+    def merge_children(self, slot: int, batch: list[tuple[int, list[tuple[str, NodeKind]]]]) -> None:
+        """
+        Merge a batch of a TreeIndexer into the table of a file.
+
+        The indexer numbers nodes in the order it lists them, so the ids of the children of every group follow each
+        other. Groups that were already expanded keep their children, they are matched by row because both read
+        children in the same order.
+        """
+        if (index_map := self._index_maps.get(slot)) is None:
+            return
+        table = self._tables[slot]
+        for indexer_node, children in batch:
+            node = index_map[indexer_node]
+            if node < 0:
+                index_map.extend([-1] * len(children))
+            elif table.is_read(node):
+                count = min(len(children), table.child_count(node))
+                index_map.extend(table.child(node, row) for row in range(count))
+                index_map.extend([-1] * (len(children) - count))
+            elif not children:
+                table.add_children(node, [])
+            else:
+                self.beginInsertRows(self._node_index(slot, node), 0, len(children) - 1)
+                start = len(table)
+                table.add_children(node, children)
+                self.endInsertRows()
+                index_map.extend(range(start, start + len(children)))
+        self._index_counts[slot] = len(index_map) - 1
+        self._file_type_changed(slot)
+
+    def _node_index(self, slot: int, node: int) -> QModelIndex:
+        """Index of a node in column 0."""
+        row = self._files.index(slot) if node == 0 else self._tables[slot].row(node)
+        return self._create_index(row, 0, slot, node)
+
+    def _file_type_changed(self, slot: int) -> None:
+        if slot in self._tables:
+            index = self._node_index(slot, 0).siblingAtColumn(1)
+            self.dataChanged.emit(index, index)
+
+    def iter_names(self, parent: QModelIndex, first: int, last: int) -> Iterator[str]:
+        """Names of the rows first to last below parent. For files, the names of all nodes read so far."""
+        table, node = self._node(parent)
+        if table is None:
+            stop = last + 1
+            for slot in self._files[first:stop]:
+                yield from self._tables[slot].names()
+            return
+        for row in range(first, last + 1):
+            yield table.name(table.child(node, row))
+
+    # ----- QAbstractItemModel interface ----- #
+    def _node(self, index: QModelIndex) -> tuple[None | NodeTable, int]:
+        """Table and node of an index. The invisible root has no table."""
+        if not index.isValid():
+            return None, -1
+        internal_id = index.internalId()
+        return self._tables[internal_id >> _NODE_BITS], internal_id & _NODE_MASK
+
+    def _create_index(self, row: int, column: int, slot: int, node: int) -> QModelIndex:
+        return self.createIndex(row, column, (slot << _NODE_BITS) | node)
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        """Get Index of Child at Row and Column."""
+        if not 0 <= row < self.rowCount(parent) or not 0 <= column < len(self._header):
+            return QModelIndex()
+        if not parent.isValid():
+            return self._create_index(row, column, self._files[row], 0)
+        slot = parent.internalId() >> _NODE_BITS
+        node = parent.internalId() & _NODE_MASK
+        return self._create_index(row, column, slot, self._tables[slot].child(node, row))
+
+    def parent(self, index: QModelIndex = QModelIndex()) -> QModelIndex:  # type: ignore[override]
+        """Get Index of Parent."""
+        table, node = self._node(index)
+        if table is None or node == 0:
+            return QModelIndex()
+        return self._node_index(index.internalId() >> _NODE_BITS, table.parent(node))
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        """Get Row Count."""
+        if parent.column() > 0:
+            return 0
+        table, node = self._node(parent)
+        if table is None:
+            return len(self._files)
+        return int(table.child_count(node))
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        """Get Column Count."""
+        return len(self._header)
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        """Check if a node has children. Groups that were not read yet are assumed to have some."""
+        table, node = self._node(parent)
+        if table is None:
+            return len(self._files) > 0
+        if not table.is_read(node):
+            return True
+        return int(table.child_count(node)) > 0
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        """Check if Children still need to be read from file."""
+        table, node = self._node(parent)
+        return table is not None and not table.is_read(node)
+
+    def fetchMore(self, parent: QModelIndex) -> None:
+        """Read Children from file."""
+        table, node = self._node(parent)
+        if table is None or table.is_read(node):
+            return
+        try:
+            with self._file_pool.lease(table.name(0)) as file:
+                children = group_children(file[table.path(node)].id)
+        except (OSError, KeyError):
+            children = []
+        if not children:
+            table.add_children(node, [])
+            return
+        self.beginInsertRows(parent, 0, len(children) - 1)
+        table.add_children(node, children)
+        self.endInsertRows()
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        """Item Flags for Cell at Index."""
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEnabled
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        """Get Name, Type and Icon depending on Role."""
+        table, node = self._node(index)
+        if table is None:
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            if index.column() == 0:
+                return table.name(node)
+            slot = index.internalId() >> _NODE_BITS
+            if node == 0 and slot in self._index_counts:
+                return f"{table.kind(node).label} (indexing, {self._index_counts[slot]} objects)"
+            return table.kind(node).label
+        if role == Qt.ItemDataRole.DecorationRole and index.column() == 1:
+            return self._icons[table.kind(node)]
+        return None
+
+    def headerData(
+        self,
+        section: int,
+        orientation: Qt.Orientation,
+        role: int = Qt.ItemDataRole.DisplayRole,
+    ) -> None | str:
+        """Get Headers for horizontal Orientation."""
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self._header[section]
+        return None
+
+
+class H5TreeFilterModel(QSortFilterProxyModel):
+    """Show only the matches of a search and their parents, instead of filtering every row of the tree."""
+
+    def __init__(self, parent: None | QObject = None) -> None:
+        """Show only the matches of a search and their parents, instead of filtering every row of the tree."""
+        super().__init__(parent)
+        self._visible: None | set[int] = None
+
+    def set_visible(self, internal_ids: None | set[int]) -> None:
+        """Show only the source rows with the given internal ids, or all rows for None."""
+        self._visible = internal_ids
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        """Check if row is a match or a parent of one."""
+        if self._visible is None or (source_model := self.sourceModel()) is None:
+            return True
+        return source_model.index(source_row, 0, source_parent).internalId() in self._visible
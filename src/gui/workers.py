@@ -0,0 +1,606 @@
+"""Workers that run file I/O in a QThreadPool."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import copy
+import logging
+import multiprocessing
+import os
+import pathlib
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any
+
+import h5py
+import numpy as np
+import numpy.typing as npt
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+from src.lib_h5.access import memory_map, row_blocks
+from src.lib_h5.dataset_types import H5DatasetType
+from src.lib_h5.decimate import DECIMATE_MIN_SAMPLES, minmax_envelope, vector_length
+from src.lib_h5.file_pool import H5FilePool
+from src.lib_h5.folder_scan import find_hdf5_files
+from src.lib_h5.metadata import NodeMeta, read_group_meta
+from src.lib_h5.node_table import NodeKind, NodeTable, iter_tree, read_tree
+from src.lib_h5.preview import dataset_summary, group_page
+from src.lib_h5.pyramid import PYRAMID_MIN_BYTES, ImagePyramid, PyramidCache, image_shape
+from src.lib_h5.slicing import Frame, FrameCache, read_frames
+from src.lib_h5.statistics import (
+    STATS_BLOCK_BYTES,
+    Statistics,
+    StatisticsCache,
+    dataset_statistics,
+    file_block_statistics,
+    has_statistics,
+)
+from src.lib_h5.structure_cache import StructureCache, file_identity
+
+# Number of bins of the envelope that is shown before the plot knows its size
+OVERVIEW_BINS = 4096
+
+# Number of frames that are read ahead in the direction of scrubbing
+PREFETCH_FRAMES = 4
+
+# Minimum time between two partial results of a StatisticsLoader
+STATS_PARTIAL_SECONDS = 0.2
+
+# Statistics of datasets of at least this size are computed in worker processes
+STATS_PROCESS_MIN_BYTES = 512 * 1024**2
+
+# Time between two checks for cancellation while waiting for worker processes
+CANCEL_POLL_SECONDS = 0.1
+
+# Maximum time and number of nodes between two batches of a TreeIndexer
+INDEX_BATCH_SECONDS = 0.2
+INDEX_BATCH_NODES = 5000
+
+
+class LoaderSignals(QObject):
+    """Signals of DatasetLoader. Results carry the id of the request, so that outdated results can be dropped."""
+
+    progress = pyqtSignal(int, int)
+    finished = pyqtSignal(int, object, object)
+    failed = pyqtSignal(int, str)
+
+
+class _Loader(QRunnable):
+    """Base class of cancellable loaders."""
+
+    def __init__(self, request_id: int, file_pool: H5FilePool, file_path: pathlib.Path, obj_path: str) -> None:
+        super().__init__()
+        self.request_id = request_id
+        self.signals = LoaderSignals()
+        self._file_pool = file_pool
+        self._file_path = file_path
+        self._obj_path = obj_path
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        """Stop reading after the current block. No signal is emitted afterwards."""
+        self._cancelled = True
+
+    @property
+    def cancelled(self) -> bool:
+        """Check if loading was cancelled."""
+        return self._cancelled
+
+    def _report_progress(self, done: int, total: int) -> bool:
+        """Emit progress. Returns False when cancelled."""
+        self.signals.progress.emit(self.request_id, int(100 * done / max(total, 1)))
+        return not self._cancelled
+
+
+class DatasetLoader(_Loader):
+    """Read a dataset and prepare it for plotting outside of the GUI thread."""
+
+    def __init__(
+        self,
+        request_id: int,
+        file_pool: H5FilePool,
+        pyramid_cache: PyramidCache,
+        file_path: pathlib.Path,
+        obj_path: str,
+        plot_type: str,
+    ) -> None:
+        """Read a dataset and prepare it for plotting outside of the GUI thread."""
+        super().__init__(request_id, file_pool, file_path, obj_path)
+        self._pyramid_cache = pyramid_cache
+        self._plot_type = plot_type
+
+    def run(self) -> None:
+        """Read and prepare data."""
+        try:
+            with self._file_pool.lease(self._file_path) as file:
+                h5_obj = file[self._obj_path]
+                is_group = isinstance(h5_obj, h5py.Group)
+                if is_group:
+                    data_type = H5DatasetType.String
+                    data: Any = group_page(h5_obj, 0)
+            if not is_group:
+                with self._file_pool.lease_dataset(self._file_path, self._obj_path) as dataset:
+                    if self._plot_type and self._plot_type != "Auto":
+                        data_type = H5DatasetType.from_string(self._plot_type)
+                    else:
+                        data_type = H5DatasetType.from_dataset(dataset)
+                    if data_type == H5DatasetType.Slices and (dataset.shape is None or dataset.ndim < 2):
+                        data_type = H5DatasetType.String
+                    data = self._load(dataset, data_type)
+                if self._cancelled:
+                    return
+        except Exception as err:
+            logging.error(f"Failed to load '{self._obj_path}'. Error: '{err}'")
+            if not self._cancelled:
+                self.signals.failed.emit(self.request_id, str(err))
+            return
+
+        if not self._cancelled:
+            self.signals.finished.emit(self.request_id, data_type, data)
+
+    def _load(self, dataset: h5py.Dataset, data_type: H5DatasetType) -> Any:
+        """Load only as much of the dataset as the plot widget for data_type needs."""
+        if data_type == H5DatasetType.Table:
+            # tables read the rows they show themselves
+            return None
+        if data_type == H5DatasetType.String:
+            # text is only read as far as it is shown
+            return dataset_summary(dataset)
+        if data_type == H5DatasetType.Array1D and vector_length(dataset) > DECIMATE_MIN_SAMPLES:
+            # long traces are never loaded completely, only their envelope
+            return minmax_envelope(dataset, OVERVIEW_BINS, callback=self._report_progress)
+        if data_type == H5DatasetType.Slices:
+            # volumes are never loaded completely, only the frames around the first one
+            display_axes = (dataset.ndim - 2, dataset.ndim - 1)
+            return read_frames(dataset, display_axes, (0,) * dataset.ndim)
+        if self._use_pyramid(dataset, data_type):
+            # large images are shown as pyramid, starting with its overview level
+            return self._load_pyramid(dataset)
+
+        data = self._read_blocks(dataset)
+        if data is None:
+            return None
+        return prepare_plot_data(data_type, data)
+
+    @staticmethod
+    def _use_pyramid(dataset: h5py.Dataset, data_type: H5DatasetType) -> bool:
+        """Check if the dataset is an image that is large enough to be shown as pyramid."""
+        if image_shape(dataset) is None or dataset.size * dataset.dtype.itemsize < PYRAMID_MIN_BYTES:
+            return False
+        return bool(
+            (data_type == H5DatasetType.Array2D and dataset.ndim == 2)
+            or (data_type == H5DatasetType.ImageRGB and dataset.ndim == 3)
+        )
+
+    def _load_pyramid(self, dataset: h5py.Dataset) -> None | ImagePyramid:
+        """Get pyramid from cache or compute its overview level. Returns None when cancelled."""
+        key = (file_identity(self._file_path), self._obj_path)
+        if (pyramid := self._pyramid_cache.get(key)) is not None:
+            return pyramid
+        if (pyramid := ImagePyramid.from_dataset(dataset, self._report_progress)) is not None:
+            self._pyramid_cache.put(key, pyramid)
+        return pyramid
+
+    def _read_blocks(self, dataset: h5py.Dataset) -> None | npt.NDArray:
+        """
+        Read dataset in blocks along the first axis. Returns None when cancelled.
+
+        Contiguous datasets are not read at all, but returned as memory map.
+        """
+        if dataset.ndim == 0 or dataset.size == 0:
+            return np.asarray(dataset[()])
+        if (mapped := memory_map(dataset)) is not None:
+            return mapped
+
+        # progress and cancellation are checked after every block
+        data = np.empty(dataset.shape, dtype=dataset.dtype)
+        n_rows = dataset.shape[0]
+        for start, stop in row_blocks(dataset):
+            if self._cancelled:
+                return None
+            data[start:stop] = dataset[start:stop]
+            self._report_progress(stop, n_rows)
+        return data
+
+
+class EnvelopeLoader(_Loader):
+    """Compute the envelope of a range of a long 1D dataset outside of the GUI thread."""
+
+    def __init__(
+        self,
+        request_id: int,
+        file_pool: H5FilePool,
+        file_path: pathlib.Path,
+        obj_path: str,
+        start: int,
+        stop: int,
+        n_bins: int,
+    ) -> None:
+        """Compute the envelope of a range of a long 1D dataset outside of the GUI thread."""
+        super().__init__(request_id, file_pool, file_path, obj_path)
+        self._start = start
+        self._stop = stop
+        self._n_bins = n_bins
+
+    def run(self) -> None:
+        """Compute envelope."""
+        try:
+            with self._file_pool.lease_dataset(self._file_path, self._obj_path) as dataset:
+                envelope = minmax_envelope(dataset, self._n_bins, self._start, self._stop, self._report_progress)
+        except Exception as err:
+            logging.error(f"Failed to load '{self._obj_path}'. Error: '{err}'")
+            if not self._cancelled:
+                self.signals.failed.emit(self.request_id, str(err))
+            return
+
+        if envelope is not None and not self._cancelled:
+            self.signals.finished.emit(self.request_id, H5DatasetType.Array1D, envelope)
+
+
+class TileLoader(_Loader):
+    """Read the tiles of a pyramid level that intersect a region outside of the GUI thread."""
+
+    def __init__(
+        self,
+        request_id: int,
+        file_pool: H5FilePool,
+        file_path: pathlib.Path,
+        obj_path: str,
+        pyramid: ImagePyramid,
+        factor: int,
+        rows: tuple[int, int],
+        cols: tuple[int, int],
+    ) -> None:
+        """Read the tiles of a pyramid level that intersect a region outside of the GUI thread."""
+        super().__init__(request_id, file_pool, file_path, obj_path)
+        self._pyramid = pyramid
+        self._factor = factor
+        self._rows = rows
+        self._cols = cols
+
+    def run(self) -> None:
+        """Read tiles and emit them as (mosaic, origin, factor)."""
+        try:
+            with self._file_pool.lease_dataset(self._file_path, self._obj_path) as dataset:
+                region = self._pyramid.region(dataset, self._factor, self._rows, self._cols, lambda: self._cancelled)
+        except Exception as err:
+            logging.error(f"Failed to load '{self._obj_path}'. Error: '{err}'")
+            if not self._cancelled:
+                self.signals.failed.emit(self.request_id, str(err))
+            return
+
+        if region is not None and not self._cancelled:
+            mosaic, origin = region
+            self.signals.finished.emit(self.request_id, None, (mosaic, origin, self._factor))
+
+
+class FrameLoader(_Loader):
+    """Read a frame of a dataset and prefetch its neighbors outside of the GUI thread."""
+
+    def __init__(
+        self,
+        request_id: int,
+        file_pool: H5FilePool,
+        file_path: pathlib.Path,
+        obj_path: str,
+        frame_cache: FrameCache,
+        display_axes: tuple[int, int],
+        index: tuple[int, ...],
+        step: None | tuple[int, int] = None,
+    ) -> None:
+        """
+        Read a frame of a dataset and prefetch its neighbors outside of the GUI thread.
+
+        :param step: axis and direction (1 or -1) of the last scrub, the next frames in this direction are prefetched
+        """
+        super().__init__(request_id, file_pool, file_path, obj_path)
+        self._frame_cache = frame_cache
+        self._display_axes = display_axes
+        self._index = index
+        self._step = step
+
+    def run(self) -> None:
+        """Read frame, then prefetch until cancelled."""
+        try:
+            with self._file_pool.lease_dataset(self._file_path, self._obj_path) as dataset:
+                frame = self._read(dataset, self._index)
+                if self._cancelled:
+                    return
+                self.signals.finished.emit(self.request_id, H5DatasetType.Slices, frame)
+                self._prefetch(dataset)
+        except Exception as err:
+            logging.error(f"Failed to load '{self._obj_path}'. Error: '{err}'")
+            if not self._cancelled:
+                self.signals.failed.emit(self.request_id, str(err))
+
+    def _prefetch(self, dataset: h5py.Dataset) -> None:
+        """Read the frames next to the current one in the direction of the last scrub."""
+        if self._step is None:
+            return
+        axis, direction = self._step
+        # mostly ahead, one frame behind for scrubbing back and forth
+        for offset in [direction * d for d in range(1, PREFETCH_FRAMES + 1)] + [-direction]:
+            i = self._index[axis] + offset
+            if self.cancelled:
+                return
+            if not 0 <= i < dataset.shape[axis]:
+                continue
+            try:
+                index = list(self._index)
+                index[axis] = i
+                self._read(dataset, tuple(index))
+            except Exception as err:
+                logging.warning(f"Failed to prefetch frame of '{self._obj_path}'. Error: '{err}'")
+                return
+
+    def _read(self, dataset: h5py.Dataset, index: tuple[int, ...]) -> Frame:
+        """Get frame from cache or read it together with the frames that share its chunks."""
+        if (frame := self._frame_cache.get(self._display_axes, index)) is not None:
+            return frame
+        frames = read_frames(dataset, self._display_axes, index)
+        if self.cancelled:
+            return frames[0]
+        for neighbor in frames:
+            self._frame_cache.put(neighbor)
+        return frames[0]
+
+
+class StatisticsSignals(LoaderSignals):
+    """Signals of StatisticsLoader, partial carries the statistics of the blocks that were read so far."""
+
+    partial = pyqtSignal(int, object)
+
+
+class StatisticsLoader(_Loader):
+    """
+    Compute statistics and histogram of a dataset block by block outside of the GUI thread.
+
+    Large datasets are split into blocks that are read and reduced in worker processes. Results are merged as they
+    arrive and emitted regularly, finished statistics are cached by file identity and dataset path.
+    """
+
+    def __init__(
+        self,
+        request_id: int,
+        file_pool: H5FilePool,
+        statistics_cache: StatisticsCache,
+        file_path: pathlib.Path,
+        obj_path: str,
+    ) -> None:
+        """Compute statistics and histogram of a dataset block by block outside of the GUI thread."""
+        super().__init__(request_id, file_pool, file_path, obj_path)
+        self.signals: StatisticsSignals = StatisticsSignals()
+        self._statistics_cache = statistics_cache
+        self._last_partial = 0.0
+
+    def run(self) -> None:
+        """Compute or look up statistics."""
+        try:
+            key = (file_identity(self._file_path), self._obj_path)
+            if (stats := self._statistics_cache.get(key)) is None:
+                with self._file_pool.lease_dataset(self._file_path, self._obj_path) as dataset:
+                    if not has_statistics(dataset):
+                        raise TypeError(f"No statistics for data of type {dataset.dtype}")
+                    if dataset.nbytes >= STATS_PROCESS_MIN_BYTES and (os.cpu_count() or 1) > 1:
+                        stats = self._compute_in_processes(dataset)
+                    else:
+                        stats = dataset_statistics(dataset, self._report_partial)
+                if stats is None:
+                    return
+                self._statistics_cache.put(key, stats)
+        except Exception as err:
+            logging.error(f"Failed to compute statistics of '{self._obj_path}'. Error: '{err}'")
+            if not self._cancelled:
+                self.signals.failed.emit(self.request_id, str(err))
+            return
+
+        if not self._cancelled:
+            self.signals.finished.emit(self.request_id, None, stats)
+
+    def _report_partial(self, stats: Statistics) -> bool:
+        """Emit progress and, at most every STATS_PARTIAL_SECONDS, a copy of the statistics. False when cancelled."""
+        now = time.monotonic()
+        if not stats.complete and now - self._last_partial >= STATS_PARTIAL_SECONDS:
+            self._last_partial = now
+            self.signals.partial.emit(self.request_id, copy.deepcopy(stats))
+        return self._report_progress(stats.done, stats.total)
+
+    def _compute_in_processes(self, dataset: h5py.Dataset) -> None | Statistics:
+        """Reduce the blocks of a dataset in worker processes, they open the file themselves."""
+        blocks = list(row_blocks(dataset, STATS_BLOCK_BYTES))
+        stats = Statistics(integer=dataset.dtype.kind in "biu")
+        stats.total = dataset.size
+        # spawn, because forking a process with running Qt threads is not safe
+        context = multiprocessing.get_context("spawn")
+        workers = max(1, min(len(blocks), os.cpu_count() or 1))
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        try:
+            pending = {
+                executor.submit(
+                    file_block_statistics, str(self._file_path), self._obj_path, start, stop, self._file_pool.profile
+                )
+                for start, stop in blocks
+            }
+            while pending:
+                done, pending = wait(pending, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stats.merge(future.result())
+                if not self._report_partial(stats):
+                    return None
+        finally:
+            # when cancelled, blocks that are still being read are not waited for
+            executor.shutdown(wait=not self._cancelled, cancel_futures=True)
+        return stats
+
+
+class IndexerSignals(QObject):
+    """Signals of TreeIndexer. All signals carry the slot of the file in the tree model."""
+
+    batch = pyqtSignal(int, object)
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+
+class TreeIndexer(QRunnable):
+    """
+    Read the whole tree and the metadata of a file outside of the GUI thread.
+
+    Groups are read breadth first, so parents are always sent before their children. Nodes are numbered in the order
+    they are read, starting with 0 for the file. Batches of (node, children) are emitted regularly, so the tree fills
+    progressively. Groups that are linked more than once are only read at their first location. The complete tree is
+    written to the structure cache.
+    """
+
+    def __init__(
+        self, slot: int, file_pool: H5FilePool, structure_cache: None | StructureCache, file_path: pathlib.Path
+    ) -> None:
+        """Read the whole tree and the metadata of a file outside of the GUI thread."""
+        super().__init__()
+        self.slot = slot
+        self.signals = IndexerSignals()
+        self._file_pool = file_pool
+        self._structure_cache = structure_cache
+        self._file_path = file_path
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        """Stop after the current group. No signal is emitted afterwards."""
+        self._cancelled = True
+
+    def run(self) -> None:
+        """Read all groups."""
+        table = NodeTable(str(self._file_path))
+        metadata: dict[str, NodeMeta] = {}
+        batch: list[tuple[int, list[tuple[str, NodeKind]]]] = []
+        batch_nodes = 0
+        last_emit = time.monotonic()
+        try:
+            with self._file_pool.lease(self._file_path) as file:
+                for node, group, children in iter_tree(file, table):
+                    if self._cancelled:
+                        return
+                    datasets = (name for name, kind in children if kind == NodeKind.Dataset)
+                    metadata.update(read_group_meta(group, table.path(node), datasets))
+
+                    batch.append((node, children))
+                    batch_nodes += len(children) + 1
+                    if batch_nodes >= INDEX_BATCH_NODES or time.monotonic() - last_emit >= INDEX_BATCH_SECONDS:
+                        self.signals.batch.emit(self.slot, batch)
+                        batch, batch_nodes, last_emit = [], 0, time.monotonic()
+        except Exception as err:
+            logging.error(f"Failed to index '{self._file_path}'. Error: '{err}'")
+            if not self._cancelled:
+                self.signals.failed.emit(self.slot, str(err))
+            return
+
+        if not self._cancelled:
+            if batch:
+                self.signals.batch.emit(self.slot, batch)
+            if self._structure_cache is not None:
+                self._structure_cache.put(self._file_path, table, metadata)
+            self.signals.finished.emit(self.slot, metadata)
+
+
+class FolderSignals(QObject):
+    """Signals of FolderLoader."""
+
+    progress = pyqtSignal(int, int)
+    opened = pyqtSignal(object, object)
+    finished = pyqtSignal()
+
+
+class FolderLoader(QRunnable):
+    """
+    Read the trees of all HDF5 files in a folder in worker processes.
+
+    Files are found by their signature, so other files are never opened with h5py. Files in the structure cache are
+    not opened at all. Every process returns the compact NodeTable and the metadata of one file, they are emitted in
+    the natsorted order of the files.
+    """
+
+    def __init__(
+        self,
+        structure_cache: None | StructureCache,
+        folder: pathlib.Path,
+        pattern: str = "*",
+        recursive: bool = False,
+        profile: str = "auto",
+    ) -> None:
+        """
+        Read the trees of all HDF5 files in a folder in worker processes.
+
+        :param profile: name of the access profile the files are opened with
+        """
+        super().__init__()
+        self.signals = FolderSignals()
+        self._structure_cache = structure_cache
+        self._folder = folder
+        self._pattern = pattern
+        self._recursive = recursive
+        self._profile = profile
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        """Stop after the current file. Tables of files that were not emitted yet are dropped."""
+        self._cancelled = True
+
+    def run(self) -> None:
+        """Find and read all files."""
+        file_paths = list(find_hdf5_files(self._folder, self._pattern, self._recursive))
+        logging.info(f"Open {len(file_paths)} files in folder '{self._folder}'")
+        cached = [None if self._structure_cache is None else self._structure_cache.get(p) for p in file_paths]
+        n_read = sum(result is None for result in cached)
+
+        # spawn, because forking a process with running Qt threads is not safe
+        context = multiprocessing.get_context("spawn")
+        workers = max(1, min(n_read, os.cpu_count() or 1))
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        try:
+            results = [
+                executor.submit(read_tree, str(file_path), self._profile) if result is None else result
+                for file_path, result in zip(file_paths, cached)
+            ]
+            for done, (file_path, result) in enumerate(zip(file_paths, results), start=1):
+                while isinstance(result, Future) and not result.done() and not self._cancelled:
+                    wait([result], timeout=CANCEL_POLL_SECONDS)
+                if self._cancelled:
+                    return
+                try:
+                    if isinstance(result, Future):
+                        table, metadata = result.result()
+                        if self._structure_cache is not None:
+                            self._structure_cache.put(file_path, table, metadata)
+                    else:
+                        table, metadata = result
+                    self.signals.opened.emit(table, metadata)
+                except Exception as err:
+                    logging.warning(f"Failed to open file '{file_path}'. Error: '{err}'")
+                self.signals.progress.emit(done, len(file_paths))
+        finally:
+            # when cancelled, files that are still being read are not waited for, their processes exit when done
+            executor.shutdown(wait=not self._cancelled, cancel_futures=True)
+        if not self._cancelled:
+            self.signals.finished.emit()
+
+
+def prepare_plot_data(data_type: H5DatasetType, data: npt.NDArray) -> Any:
+    """Convert data to what the plot widget for data_type expects."""
+    if data.dtype.kind == "b":
+        data = data.astype(np.uint8)
+    if data_type == H5DatasetType.Array1D and data.ndim == 2 and min(data.shape) == 1:
+        return data.ravel()
+    if data_type == H5DatasetType.ImageRGB:
+        return np.sum(data, axis=0)
+    return data
@@ -0,0 +1,210 @@
+"""File access profiles and chunk caches that match the layout of datasets."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import math
+import os
+import re
+from typing import Any, Iterator, NamedTuple
+
+import h5py
+import numpy as np
+
+# Maximum size of one read when a dataset is read block by block
+READ_BLOCK_BYTES = 16 * 1024**2
+
+# Files up to this size are read into memory completely when they are opened
+CORE_MAX_BYTES = 16 * 1024**2
+
+# Chunk cache of datasets that are not opened with open_dataset
+FILE_CHUNK_CACHE_BYTES = 16 * 1024**2
+
+# Limits of the chunk cache of datasets opened with open_dataset. It is never smaller than one chunk.
+DATASET_CHUNK_CACHE_MIN_BYTES = 1024**2
+DATASET_CHUNK_CACHE_MAX_BYTES = 64 * 1024**2
+
+# Preference for evicting chunks that were read completely, data is only read, so they are rarely needed again soon
+CHUNK_CACHE_W0 = 0.75
+
+# Page buffer for files written with paged aggregation, HDF5 ignores it for all other files
+PAGE_BUFFER_BYTES = 4 * 1024**2
+
+# Member file of a family, like data_0.h5 or data_00001.h5
+_FAMILY_MEMBER = re.compile(r"^(.*?)(\d+)(\.[^.]*)$")
+
+
+def _next_prime(n: int) -> int:
+    """Smallest prime that is at least n."""
+    n = max(2, n)
+    while any(n % d == 0 for d in range(2, math.isqrt(n) + 1)):
+        n += 1
+    return n
+
+
+def _cache_slots(nbytes: int, chunk_bytes: int) -> int:
+    """Get the number of chunk cache slots HDF5 recommends: a prime about 100 times the chunks the cache holds."""
+    return _next_prime(min(1_000_000, 100 * max(1, nbytes // max(1, chunk_bytes))))
+
+
+class AccessProfile(NamedTuple):
+    """Driver and cache settings h5py.File is opened with."""
+
+    driver: None | str = None
+    rdcc_nbytes: int = FILE_CHUNK_CACHE_BYTES
+    # chunks of 64 KiB are assumed, as the datasets are not known when a file is opened
+    rdcc_nslots: int = _cache_slots(FILE_CHUNK_CACHE_BYTES, 64 * 1024)
+    rdcc_w0: float = CHUNK_CACHE_W0
+    page_buf_size: int = PAGE_BUFFER_BYTES
+
+    def kwargs(self) -> dict[str, Any]:
+        """Keyword arguments of h5py.File."""
+        kwargs: dict[str, Any] = {
+            "rdcc_nbytes": self.rdcc_nbytes,
+            "rdcc_nslots": self.rdcc_nslots,
+            "rdcc_w0": self.rdcc_w0,
+            "page_buf_size": self.page_buf_size,
+        }
+        if self.driver == "core":
+            kwargs.update(driver="core", backing_store=False)
+        elif self.driver == "family":
+            # the member size is read from the first member
+            kwargs.update(driver="family", memb_size=0)
+        elif self.driver is not None:
+            kwargs["driver"] = self.driver
+        return kwargs
+
+
+# Profiles by name, "auto" picks one of them for every file
+PROFILES = {
+    "sec2": AccessProfile(),
+    "core": AccessProfile(driver="core"),
+    "family": AccessProfile(driver="family"),
+}
+
+
+def pick_profile(file_path: str | os.PathLike[str]) -> str:
+    """Read small files into memory at once, read all other files on demand."""
+    return "core" if os.path.getsize(file_path) <= CORE_MAX_BYTES else "sec2"
+
+
+def family_pattern(file_path: str | os.PathLike[str]) -> None | str:
+    """Name pattern of the family a file could be a member of, like data_%d.h5 for data_0.h5."""
+    if (match := _FAMILY_MEMBER.match(os.fspath(file_path))) is None:
+        return None
+    prefix, number, suffix = match.groups()
+    width = f"0{len(number)}" if len(number) > 1 and number.startswith("0") else ""
+    return f"{prefix.replace('%', '%%')}%{width}d{suffix.replace('%', '%%')}"
+
+
+def open_file(file_path: str | os.PathLike[str], profile: str = "auto") -> h5py.File:
+    """
+    Open a file read-only with an access profile.
+
+    Files that can not be opened on their own, but are the first member of a file family, are opened as family.
+
+    :param file_path: file to open
+    :param profile: name of one of PROFILES, or "auto" to pick one by file size
+    :raises OSError: if the file can not be opened
+    """
+    name = pick_profile(file_path) if profile == "auto" else profile
+    try:
+        return h5py.File(file_path, "r", **PROFILES[name].kwargs())
+    except OSError as err:
+        if (pattern := family_pattern(file_path)) is None or pattern % 0 != os.fspath(file_path):
+            raise
+        try:
+            return h5py.File(pattern, "r", **PROFILES["family"].kwargs())
+        except OSError:
+            raise err from None
+
+
+def chunk_cache(dataset: h5py.Dataset) -> None | tuple[int, int]:
+    """
+    Size and number of slots of a chunk cache for a chunked dataset, None for other datasets.
+
+    The cache holds one layer of chunks across all axes but the first, so that reading rows, frames or tiles does not
+    decompress a chunk again for every read that touches it.
+    """
+    if dataset.chunks is None:
+        return None
+    chunk_bytes = math.prod(dataset.chunks) * dataset.dtype.itemsize
+    layer = math.prod(-(-n // c) for n, c in zip(dataset.shape[1:], dataset.chunks[1:]))
+    nbytes = min(chunk_bytes * layer, DATASET_CHUNK_CACHE_MAX_BYTES)
+    nbytes = max(nbytes, chunk_bytes, DATASET_CHUNK_CACHE_MIN_BYTES)
+    return nbytes, _cache_slots(nbytes, chunk_bytes)
+
+
+def open_dataset(file: h5py.File, obj_path: str) -> h5py.Dataset:
+    """Open a dataset with a chunk cache that matches its chunk layout."""
+    dataset = file[obj_path]
+    if not isinstance(dataset, h5py.Dataset) or (cache := chunk_cache(dataset)) is None:
+        return dataset
+    name = dataset.name.encode()
+    # all open handles of a dataset share one chunk cache, it is only created with the first one
+    dataset.id.close()
+    nbytes, nslots = cache
+    dapl = h5py.h5p.create(h5py.h5p.DATASET_ACCESS)
+    dapl.set_chunk_cache(nslots, nbytes, CHUNK_CACHE_W0)
+    return h5py.Dataset(h5py.h5d.open(file.id, name, dapl=dapl))
+
+
+def memory_map(dataset: h5py.Dataset) -> None | np.memmap:
+    """
+    Map a contiguous, uncompressed dataset of numbers into memory. None if its bytes are not stored as they are.
+
+    Only the pages that are accessed are read, by the operating system instead of HDF5.
+    """
+    if (
+        dataset.chunks is not None
+        or dataset.external
+        or dataset.shape is None
+        or dataset.size == 0
+        or dataset.dtype.kind not in "biufc"
+        or dataset.file.driver != "sec2"
+    ):
+        return None
+    if (offset := dataset.id.get_offset()) is None:
+        # not allocated yet, only the fill value would be read
+        return None
+    return np.memmap(dataset.file.filename, dtype=dataset.dtype, mode="r", offset=offset, shape=dataset.shape)
+
+
+def data_reader(dataset: h5py.Dataset) -> h5py.Dataset | np.memmap:
+    """
+    Memory map of a dataset if it can be mapped, otherwise the dataset itself.
+
+    Both are read by slicing. Slices of the map are views, so only the pages they touch are read from the file.
+    """
+    mapped = memory_map(dataset)
+    return dataset if mapped is None else mapped
+
+
+def row_blocks(dataset: h5py.Dataset, block_bytes: int = READ_BLOCK_BYTES) -> Iterator[tuple[int, int]]:
+    """
+    Split the first axis of a dataset into ranges of rows of about block_bytes. Scalar datasets are one range (0, 1).
+
+    Ranges of chunked datasets hold whole chunks, so that no chunk is decompressed twice.
+    """
+    if dataset.ndim == 0:
+        yield 0, 1
+        return
+    n_rows = dataset.shape[0]
+    row_bytes = max(1, dataset.dtype.itemsize * (dataset.size // max(1, n_rows)))
+    block_rows = max(1, block_bytes // row_bytes)
+    if dataset.chunks is not None:
+        block_rows = max(dataset.chunks[0], block_rows // dataset.chunks[0] * dataset.chunks[0])
+    for start in range(0, n_rows, block_rows):
+        yield start, min(start + block_rows, n_rows)
@@ -17,7 +17,13 @@
 
 from enum import Enum, auto
 
-import numpy.typing as npt
+import h5py
+
+# Numeric 2D datasets with fewer elements are shown as table
+TABLE_MAX_SIZE = 100
+
+# 3D datasets with this many entries on axis 0 are images with one color per entry, other 3D datasets are volumes
+RGB_CHANNELS = (3, 4)
 
 
 class H5DatasetType(Enum):
@@ -29,6 +35,7 @@ class H5DatasetType(Enum):
     Array2D = auto()
     ImageRGB = auto()
     Table = auto()
+    Slices = auto()
 
     @classmethod
     def from_string(cls, plot_type: str) -> "H5DatasetType":
@@ -44,23 +51,42 @@ class H5DatasetType(Enum):
                 return cls.Table
             case "ImageRGB":
                 return cls.ImageRGB
+            case "Slices":
+                return cls.Slices
             case _:
                 return cls.String
 
     @classmethod
-    def from_numpy_array(cls, array: npt.NDArray) -> "H5DatasetType":
-        """Construct type from numpy array."""
-        arr_type = str(array.dtype)
-        arr_shape = len(array.shape)
-        arr_size = array.size
-
-        if arr_shape == 1 and ("int" in arr_type or "float" in arr_type):
-            return cls.Array1D
-
-        if arr_shape == 2 and ("int" in arr_type or "float" in arr_type) and arr_size < 100:
+    def from_dataset(cls, dataset: h5py.Dataset) -> "H5DatasetType":
+        """Construct type from the metadata of a dataset. No data is read."""
+        dtype = dataset.dtype
+        shape = dataset.shape
+        if shape is None or dataset.size == 0 or len(shape) == 0:
+            return cls.String
+        if dtype.names is not None:
             return cls.Table
+        if dtype.kind == "c":
+            # tables show real and imaginary part without converting them
+            return cls.Table if len(shape) <= 2 else cls.String
+        if dtype.kind not in "iufb":
+            # fixed and variable length strings, opaque, references
+            return cls.String
 
-        if arr_shape == 3 and ("int" in arr_type or "float" in arr_type):
-            return cls.ImageRGB
+        if dataset.attrs.get("CLASS") in (b"IMAGE", "IMAGE"):
+            if len(shape) == 2:
+                return cls.Array2D
+            if len(shape) == 3 and dataset.attrs.get("INTERLACE_MODE") in (b"INTERLACE_PLANE", "INTERLACE_PLANE"):
+                return cls.ImageRGB
 
-        return cls.String
+        if len(shape) == 1:
+            return cls.Array1D
+        if len(shape) == 2:
+            if min(shape) == 1:
+                return cls.Array1D
+            if dataset.size < TABLE_MAX_SIZE:
+                return cls.Table
+            return cls.Array2D
+        if len(shape) == 3 and shape[0] in RGB_CHANNELS:
+            return cls.ImageRGB
+        # volumes and anything with more dimensions are shown frame by frame
+        return cls.Slices
@@ -0,0 +1,119 @@
+"""Min/max envelope of long 1D datasets."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from typing import Callable
+
+import h5py
+import numpy as np
+import numpy.typing as npt
+
+from src.lib_h5.access import READ_BLOCK_BYTES, data_reader
+
+# Datasets with more samples than this are plotted as envelope
+DECIMATE_MIN_SAMPLES = 1_000_000
+
+
+class Envelope:
+    """Min/max envelope of the samples start to stop of a 1D dataset."""
+
+    def __init__(self, x: npt.NDArray, y: npt.NDArray, start: int, stop: int, step: int, length: int) -> None:
+        """Min/max envelope of the samples start to stop of a 1D dataset."""
+        self.x = x
+        self.y = y
+        self.start = start
+        self.stop = stop
+        self.step = step
+        self.length = length
+
+
+def vector_length(dataset: h5py.Dataset) -> int:
+    """Get the number of samples of 1D datasets and row or column vectors, 0 for all other datasets."""
+    if dataset.dtype.kind not in "iuf":
+        return 0
+    if dataset.ndim == 1:
+        return int(dataset.shape[0])
+    if dataset.ndim == 2 and min(dataset.shape) == 1:
+        return int(max(dataset.shape))
+    return 0
+
+
+def _read(dataset: h5py.Dataset | np.memmap, start: int, stop: int) -> npt.NDArray:
+    """Read samples start to stop of a 1D dataset or vector."""
+    if dataset.ndim == 1:
+        return np.asarray(dataset[start:stop])
+    if dataset.shape[0] == 1:
+        return np.asarray(dataset[0, start:stop])
+    return np.asarray(dataset[start:stop, 0])
+
+
+def minmax_envelope(
+    dataset: h5py.Dataset,
+    n_bins: int,
+    start: int = 0,
+    stop: None | int = None,
+    callback: None | Callable[[int, int], bool] = None,
+) -> None | Envelope:
+    """
+    Compute minimum and maximum of n_bins bins between start and stop.
+
+    The dataset is read in blocks that are aligned to its chunks, so that memory use only depends on n_bins and the
+    block size. Ranges with less than 2 * n_bins samples are returned as they are.
+
+    :param dataset: 1D dataset, row or column vector
+    :param n_bins: number of bins, usually the width of the plot in pixels
+    :param start: first sample
+    :param stop: last sample (exclusive), defaults to the length of the dataset
+    :param callback: called with (samples done, samples total) after every block, return False to cancel
+    :return: envelope, or None if cancelled
+    """
+    length = vector_length(dataset)
+    stop = length if stop is None else min(stop, length)
+    start = max(0, min(start, stop))
+    n_samples = stop - start
+
+    if n_samples <= 2 * n_bins:
+        y = _read(data_reader(dataset), start, stop).astype(np.float64)
+        return Envelope(np.arange(start, stop, dtype=np.float64), y, start, stop, 1, length)
+
+    step = -(-n_samples // n_bins)
+    n_bins = -(-n_samples // step)
+    mins = np.full(n_bins, np.inf)
+    maxs = np.full(n_bins, -np.inf)
+
+    reader = data_reader(dataset)
+    chunk_len = max(dataset.chunks) if dataset.chunks is not None else 1
+    block = max(chunk_len, READ_BLOCK_BYTES // dataset.dtype.itemsize // chunk_len * chunk_len)
+    for block_start in range(start // chunk_len * chunk_len, stop, block):
+        a = max(block_start, start)
+        e = min(block_start + block, stop)
+        data = _read(reader, a, e)
+
+        first_bin = (a - start) // step
+        last_bin = (e - 1 - start) // step
+        bounds: npt.NDArray[np.int64] = np.arange(first_bin, last_bin + 1) * step + start - a
+        bounds[0] = 0
+        bins = slice(first_bin, last_bin + 1)
+        np.fmin(mins[bins], np.fmin.reduceat(data, bounds), out=mins[bins])
+        np.fmax(maxs[bins], np.fmax.reduceat(data, bounds), out=maxs[bins])
+
+        if callback is not None and not callback(e - start, n_samples):
+            return None
+
+    # draw every bin as vertical line from min to max
+    x: npt.NDArray[np.float64] = np.repeat(start + np.arange(n_bins, dtype=np.float64) * step + step / 2, 2)
+    y = np.column_stack((mins, maxs)).ravel()
+    return Envelope(x, y, start, stop, step, length)
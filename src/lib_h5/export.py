@@ -0,0 +1,136 @@
+"""Export selections of datasets to .npy and .csv files."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import pathlib
+from typing import Any
+
+import h5py
+import numpy as np
+
+from src.lib_h5.access import READ_BLOCK_BYTES
+
+
+def parse_selection(text: str) -> tuple[Any, ...]:
+    """
+    Parse a numpy style selection like '0:100, ::2, 5'.
+
+    :raises ValueError: if an item is neither an integer nor a slice
+    """
+    if not text.strip():
+        return ()
+    selection: list[Any] = []
+    for item in text.split(","):
+        item = item.strip()
+        if ":" in item:
+            parts = item.split(":")
+            if len(parts) > 3:
+                raise ValueError(f"invalid slice '{item}'")
+            selection.append(slice(*(int(p) if p.strip() else None for p in parts)))
+        else:
+            selection.append(int(item))
+    return tuple(selection)
+
+
+def selection_shape(shape: tuple[int, ...], selection: tuple[Any, ...]) -> tuple[int, ...]:
+    """Shape of a selection of a dataset, without reading it."""
+    out = []
+    for axis, length in enumerate(shape):
+        item = selection[axis] if axis < len(selection) else slice(None)
+        if isinstance(item, slice):
+            out.append(len(range(*item.indices(length))))
+    return tuple(out)
+
+
+def _read(dataset: h5py.Dataset, selection: tuple[Any, ...]) -> Any:
+    """
+    Read a selection of integers, slices and ranges.
+
+    h5py only reads in increasing order, so items with negative steps are read forwards and the result is reversed.
+    """
+    forward: list[Any] = []
+    reverse: list[int] = []
+    for axis, item in enumerate(selection):
+        if isinstance(item, (slice, range)):
+            rows = item if isinstance(item, range) else range(*item.indices(dataset.shape[axis]))
+            if rows.step < 0 and len(rows) > 0:
+                reverse.append(sum(isinstance(i, (slice, range)) for i in forward))
+                rows = rows[::-1]
+            item = slice(rows.start, rows.stop, rows.step) if len(rows) else slice(0, 0)
+        forward.append(item)
+    data = np.asarray(dataset[tuple(forward)])
+    return np.flip(data, axis=tuple(reverse)) if reverse else data
+
+
+def _row_blocks(dataset: h5py.Dataset, selection: tuple[Any, ...]) -> Any:
+    """Read a selection in blocks along its first axis, so memory does not depend on its size."""
+    selection = selection + (slice(None),) * (dataset.ndim - len(selection))
+    # leading integer indices do not create an axis, read them as part of every block
+    axis = next((i for i, item in enumerate(selection) if isinstance(item, slice)), None)
+    if axis is None:
+        yield _read(dataset, selection)
+        return
+    rows = range(*selection[axis].indices(dataset.shape[axis]))
+    row_bytes = max(1, dataset.dtype.itemsize * int(np.prod(selection_shape(dataset.shape, selection)[1:])))
+    block = max(1, READ_BLOCK_BYTES // row_bytes)
+    for start in range(0, len(rows), block):
+        stop = start + block
+        block_selection = list(selection)
+        # a range, as a slice can not stop before index 0 when its step is negative
+        block_selection[axis] = rows[start:stop]
+        yield _read(dataset, tuple(block_selection))
+
+
+def _cell(item: Any) -> str:
+    return item.decode(errors="replace") if isinstance(item, bytes) else str(item)
+
+
+def export_dataset(dataset: h5py.Dataset, selection: tuple[Any, ...], out_path: pathlib.Path) -> tuple[int, ...]:
+    """
+    Write a selection of a dataset to a .npy or .csv file, reading it block by block.
+
+    CSV files hold one row per element of the first axis, all other axes are flattened into columns.
+
+    :return: shape of the exported array
+    :raises ValueError: if the file type is not supported
+    """
+    shape = selection_shape(dataset.shape or (), selection)
+    suffix = out_path.suffix.lower()
+    if suffix == ".npy":
+        out = np.lib.format.open_memmap(out_path, mode="w+", dtype=dataset.dtype, shape=shape)
+        row = 0
+        for block in _row_blocks(dataset, selection):
+            if block.ndim == 0:
+                out[()] = block
+                continue
+            stop = row + len(block)
+            out[row:stop] = block
+            row = stop
+        out.flush()
+    elif suffix in (".csv", ".txt"):
+        with open(out_path, "w") as file:
+            if dataset.dtype.names is not None:
+                file.write(",".join(dataset.dtype.names) + "\n")
+            for block in _row_blocks(dataset, selection):
+                block = np.atleast_1d(block)
+                if dataset.dtype.names is not None:
+                    rows = [[_cell(item) for item in record] for record in block.ravel()]
+                else:
+                    rows = block.reshape(len(block), -1).astype(str).tolist()
+                file.writelines(",".join(row) + "\n" for row in rows)
+    else:
+        raise ValueError(f"unsupported file type '{suffix}', use .npy or .csv")
+    return shape
@@ -0,0 +1,163 @@
+"""Pool of open HDF5 file handles."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import contextlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Iterator
+
+import h5py
+
+from src.lib_h5.access import open_dataset, open_file
+
+
+class H5FilePool:
+    """
+    Keep files open read-only, so that they are not reopened for every access.
+
+    Files are leased for the duration of a with block. At most max_open files are kept open, the least recently used
+    file that is not leased is closed first. A file is reopened when its modification time or size changed since it
+    was opened, handles that are still leased are closed when their last lease ends. Files are opened with an access
+    profile, datasets that are leased with lease_dataset() are kept open with a chunk cache that matches their layout.
+    """
+
+    def __init__(self, max_open: int = 32, profile: str = "auto", max_datasets: int = 16) -> None:
+        """Keep files open read-only, so that they are not reopened for every access."""
+        self.max_open = max_open
+        self.profile = profile
+        self.max_datasets = max_datasets
+        self._files: OrderedDict[str, tuple[h5py.File, int, int]] = OrderedDict()
+        self._datasets: OrderedDict[tuple[str, str], h5py.Dataset] = OrderedDict()
+        # number of leases by id of the handle, and handles that are closed when their last lease ends
+        self._leases: dict[int, int] = {}
+        self._retired: dict[int, tuple[str, h5py.File]] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(file_path: str | os.PathLike[str]) -> str:
+        return os.path.abspath(os.fspath(file_path))
+
+    def __len__(self) -> int:
+        """Get number of open files."""
+        return len(self._files)
+
+    def __contains__(self, file_path: str | os.PathLike[str]) -> bool:
+        """Check if a file is currently open."""
+        return self._key(file_path) in self._files
+
+    @contextlib.contextmanager
+    def lease(self, file_path: str | os.PathLike[str]) -> Iterator[h5py.File]:
+        """
+        Lease an open file handle, it stays open until the with block is left.
+
+        Objects of the file must not be used after the with block.
+
+        :raises OSError: if the file can not be opened
+        """
+        file = self._acquire(file_path)
+        try:
+            yield file
+        finally:
+            self._release(file)
+
+    @contextlib.contextmanager
+    def lease_dataset(self, file_path: str | os.PathLike[str], obj_path: str) -> Iterator[h5py.Dataset]:
+        """
+        Lease an open dataset. Its chunk cache is kept, so repeated reads of the same chunks only decompress them once.
+
+        :raises OSError: if the file can not be opened
+        :raises KeyError: if there is no object at obj_path
+        :raises TypeError: if the object is not a dataset
+        """
+        with self.lease(file_path) as file:
+            with self._lock:
+                key = (self._key(file_path), obj_path)
+                if (dataset := self._datasets.get(key)) is None or not dataset.id.valid:
+                    dataset = open_dataset(file, obj_path)
+                    if not isinstance(dataset, h5py.Dataset):
+                        raise TypeError(f"'{obj_path}' is not a dataset")
+                    self._datasets[key] = dataset
+                self._datasets.move_to_end(key)
+                while len(self._datasets) > self.max_datasets:
+                    self._datasets.popitem(last=False)
+            yield dataset
+
+    def _acquire(self, file_path: str | os.PathLike[str]) -> h5py.File:
+        """Get open file handle and count a lease of it."""
+        key = self._key(file_path)
+        stat = os.stat(key)
+        with self._lock:
+            if key in self._files:
+                file, mtime, size = self._files[key]
+                if not file.id.valid or mtime != stat.st_mtime_ns or size != stat.st_size:
+                    logging.info(f"File '{key}' changed on disk, reopening")
+                    self._close(key)
+            if key in self._files:
+                self._files.move_to_end(key)
+            else:
+                file = open_file(key, self.profile)
+                self._files[key] = (file, stat.st_mtime_ns, stat.st_size)
+            file = self._files[key][0]
+            self._leases[id(file)] = self._leases.get(id(file), 0) + 1
+            self._evict()
+            return file
+
+    def _release(self, file: h5py.File) -> None:
+        """End a lease, close the handle if it was retired while leased."""
+        with self._lock:
+            if count := self._leases.pop(id(file)) - 1:
+                self._leases[id(file)] = count
+            elif id(file) in self._retired:
+                self._close_handle(*self._retired.pop(id(file)))
+            self._evict()
+
+    def _evict(self) -> None:
+        """Close the least recently used files that are not leased, until at most max_open files are open."""
+        idle = [key for key, (file, _, _) in self._files.items() if id(file) not in self._leases]
+        for key in idle[: max(0, len(self._files) - self.max_open)]:
+            self._close(key)
+
+    def _close(self, key: str) -> None:
+        """Remove a file from the pool. Its handle is closed at once, or when its last lease ends."""
+        for dataset_key in [k for k in self._datasets if k[0] == key]:
+            del self._datasets[dataset_key]
+        file, _, _ = self._files.pop(key)
+        if id(file) in self._leases:
+            self._retired[id(file)] = (key, file)
+        else:
+            self._close_handle(key, file)
+
+    @staticmethod
+    def _close_handle(key: str, file: h5py.File) -> None:
+        try:
+            file.close()
+        except (OSError, ValueError) as err:
+            logging.warning(f"Failed to close file '{key}'. Error: '{err}'")
+
+    def close(self, file_path: str | os.PathLike[str]) -> None:
+        """Close file if it is open. A leased file is closed when its last lease ends."""
+        with self._lock:
+            if (key := self._key(file_path)) in self._files:
+                self._close(key)
+
+    def close_all(self) -> None:
+        """Close all files. Leased files are closed when their last lease ends."""
+        with self._lock:
+            while self._files:
+                self._close(next(iter(self._files)))
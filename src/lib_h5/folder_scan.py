@@ -0,0 +1,61 @@
+"""Find HDF5 files in folders."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import fnmatch
+import os
+import pathlib
+from typing import Iterator
+
+from natsort import natsorted
+
+HDF5_SIGNATURE = b"\x89HDF\r\n\x1a\n"
+
+
+def is_hdf5_file(file_path: str | pathlib.Path) -> bool:
+    """
+    Check the HDF5 signature of a file without opening it with h5py.
+
+    The signature is at offset 0, or after a user block at 512, 1024, 2048, ... bytes.
+    """
+    try:
+        with open(file_path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            offset = 0
+            while offset + len(HDF5_SIGNATURE) <= size:
+                file.seek(offset)
+                if file.read(len(HDF5_SIGNATURE)) == HDF5_SIGNATURE:
+                    return True
+                offset = 512 if offset == 0 else 2 * offset
+    except OSError:
+        return False
+    return False
+
+
+def find_hdf5_files(folder: str | pathlib.Path, pattern: str = "*", recursive: bool = False) -> Iterator[pathlib.Path]:
+    """
+    Natsorted HDF5 files in a folder whose names match a glob pattern.
+
+    :param folder: folder to search
+    :param pattern: glob pattern matched against the file name, e.g. '*.h5'
+    :param recursive: also search all subfolders
+    """
+    for dir_path, dir_names, file_names in os.walk(folder):
+        dir_names[:] = natsorted(dir_names) if recursive else []
+        for name in natsorted(file_names):
+            file_path = pathlib.Path(dir_path, name)
+            if fnmatch.fnmatch(name, pattern) and is_hdf5_file(file_path):
+                yield file_path
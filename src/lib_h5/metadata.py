@@ -0,0 +1,65 @@
+"""Metadata of HDF5 objects that is read without reading their data."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import math
+from typing import Iterable, Iterator, NamedTuple
+
+import h5py
+
+# Attributes with more elements than this are described by shape and dtype instead of their value
+ATTR_MAX_SIZE = 100
+
+# Longer attribute values are truncated
+VALUE_MAX_LENGTH = 200
+
+
+class NodeMeta(NamedTuple):
+    """Shape and dtype of a dataset and the attributes of an object. Groups have no shape and an empty dtype."""
+
+    shape: None | tuple[int, ...]
+    dtype: str
+    attrs: tuple[tuple[str, str], ...]
+
+
+def attr_to_str(attrs: h5py.AttributeManager, name: str) -> str:
+    """Value of an attribute as string. Large attributes are described by shape and dtype, long values truncated."""
+    attr_id = attrs.get_id(name)
+    if attr_id.shape is not None and math.prod(attr_id.shape) > ATTR_MAX_SIZE:
+        return f"<{attr_id.dtype} array of shape {attr_id.shape}>"
+    try:
+        value = attrs[name]
+    except (OSError, TypeError) as err:
+        return f"<unreadable: {err}>"
+    if isinstance(value, bytes):
+        value = value.decode(errors="replace")
+    text = str(value)
+    return text if len(text) <= VALUE_MAX_LENGTH else text[: VALUE_MAX_LENGTH - 3] + "..."
+
+
+def read_meta(obj: h5py.Group | h5py.Dataset) -> NodeMeta:
+    """Metadata of a group or dataset."""
+    attrs = tuple((name, attr_to_str(obj.attrs, name)) for name in obj.attrs)
+    if isinstance(obj, h5py.Dataset):
+        return NodeMeta(obj.shape, str(obj.dtype), attrs)
+    return NodeMeta(None, "", attrs)
+
+
+def read_group_meta(group: h5py.Group, path: str, dataset_names: Iterable[str]) -> Iterator[tuple[str, NodeMeta]]:
+    """Metadata of a group and of its child datasets by path."""
+    yield path, read_meta(group)
+    for name in dataset_names:
+        yield f"{path.rstrip('/')}/{name}", read_meta(group[name])
@@ -0,0 +1,205 @@
+"""Compact, array based table of the nodes of a file tree."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from array import array
+from collections import deque
+from typing import Iterable, Iterator
+
+import h5py
+
+from src.lib_h5.access import open_file
+from src.lib_h5.metadata import NodeMeta, read_group_meta
+from src.lib_h5.recursive_iterator import NodeKind, group_children
+
+
+class NodeTable:
+    """
+    Tree of one file stored in flat arrays.
+
+    Node 0 is the file itself. The children of a node are always appended in one batch, so they are stored
+    contiguously starting at first_child. Names are utf-8 encoded into one string pool, the name of node n ends where
+    the name of node n + 1 starts.
+    """
+
+    NOT_READ = -1
+
+    def __init__(self, file_name: str) -> None:
+        """Tree of one file stored in flat arrays."""
+        self._parent = array("q")
+        self._first_child = array("q")
+        self._child_count = array("q")
+        self._name_offset = array("q")
+        self._kind = array("b")
+        self._names = bytearray()
+        self._append(-1, file_name, NodeKind.File)
+
+    def __len__(self) -> int:
+        """Get number of nodes."""
+        return len(self._kind)
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory used by the table."""
+        arrays = (self._parent, self._first_child, self._child_count, self._name_offset, self._kind)
+        return sum(a.itemsize * len(a) for a in arrays) + len(self._names)
+
+    def _append(self, parent: int, name: str, kind: NodeKind) -> None:
+        self._parent.append(parent)
+        self._first_child.append(self.NOT_READ)
+        self._child_count.append(0)
+        self._name_offset.append(len(self._names))
+        self._kind.append(kind)
+        self._names += name.encode()
+
+    def add_children(self, node: int, children: Iterable[tuple[str, NodeKind]]) -> None:
+        """Store the children of a node. Can only be called once per node."""
+        if self.is_read(node):
+            raise ValueError(f"children of node {node} were already added")
+        start = len(self)
+        for name, kind in children:
+            self._append(node, name, kind)
+        self._first_child[node] = start
+        self._child_count[node] = len(self) - start
+
+    def set_file_name(self, file_name: str) -> None:
+        """Rename the file node, e.g. to the path a cached file was opened with."""
+        old_end = self._name_offset[1] if len(self) > 1 else len(self._names)
+        new_name = file_name.encode()
+        delta = len(new_name) - old_end
+        self._names[:old_end] = new_name
+        for node in range(1, len(self)):
+            self._name_offset[node] += delta
+
+    def name(self, node: int) -> str:
+        """Name of a node."""
+        end = self._name_offset[node + 1] if node + 1 < len(self) else len(self._names)
+        start = self._name_offset[node]
+        return self._names[start:end].decode()
+
+    def kind(self, node: int) -> NodeKind:
+        """Kind of a node."""
+        return NodeKind(self._kind[node])
+
+    def parent(self, node: int) -> int:
+        """Parent of a node, -1 for the file node."""
+        return self._parent[node]
+
+    def is_read(self, node: int) -> bool:
+        """Check if the children of a node were added."""
+        return self._kind[node] == NodeKind.Dataset or self._first_child[node] != self.NOT_READ
+
+    def child_count(self, node: int) -> int:
+        """Get number of children that were added."""
+        return self._child_count[node]
+
+    def child(self, node: int, row: int) -> int:
+        """Child of a node at row."""
+        return self._first_child[node] + row
+
+    def row(self, node: int) -> int:
+        """Row of a node below its parent."""
+        parent = self._parent[node]
+        if parent < 0:
+            return 0
+        return node - self._first_child[parent]
+
+    def path(self, node: int) -> str:
+        """HDF5 object path of a node."""
+        names = []
+        while node > 0:
+            names.append(self.name(node))
+            node = self._parent[node]
+        return "/" + "/".join(reversed(names))
+
+    def names(self) -> Iterator[str]:
+        """Names of all nodes."""
+        return (self.name(node) for node in range(len(self)))
+
+    def paths(self) -> list[str]:
+        """HDF5 object paths of all nodes. Faster than path for every node, because parents come before children."""
+        paths = ["/"]
+        for node in range(1, len(self)):
+            parent_path = paths[self._parent[node]]
+            paths.append(f"{parent_path.rstrip('/')}/{self.name(node)}")
+        return paths
+
+    def to_bytes(self) -> bytes:
+        """Serialize the table in native byte order."""
+        header = array("q", [len(self), len(self._names)])
+        arrays = (header, self._parent, self._first_child, self._child_count, self._name_offset, self._kind)
+        return b"".join(a.tobytes() for a in arrays) + bytes(self._names)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "NodeTable":
+        """Deserialize a table written by to_bytes."""
+        table = cls.__new__(cls)
+        header = array("q")
+        header.frombytes(data[: 2 * header.itemsize])
+        n_nodes, n_names = header
+        offset = 2 * header.itemsize
+        for attr, typecode in (
+            ("_parent", "q"),
+            ("_first_child", "q"),
+            ("_child_count", "q"),
+            ("_name_offset", "q"),
+            ("_kind", "b"),
+        ):
+            values = array(typecode)
+            end = offset + n_nodes * values.itemsize
+            values.frombytes(data[offset:end])
+            offset = end
+            setattr(table, attr, values)
+        end = offset + n_names
+        table._names = bytearray(data[offset:end])
+        return table
+
+
+def iter_tree(file: h5py.File, table: NodeTable) -> Iterator[tuple[int, h5py.Group, list[tuple[str, NodeKind]]]]:
+    """
+    Read the whole tree of a file breadth first into a table that only contains the file.
+
+    Every group is yielded with its node and children after the children were added to the table, so parents always
+    come before their children. Groups that are linked more than once are only read at their first location.
+    """
+    visited: set[int] = set()
+    queue: deque[int] = deque([0])
+    while queue:
+        node = queue.popleft()
+        group = file[table.path(node)]
+        if hash(group.id) in visited:
+            continue
+        visited.add(hash(group.id))
+        start = len(table)
+        children = group_children(group.id)
+        table.add_children(node, children)
+        yield node, group, children
+        queue.extend(start + row for row, (_, kind) in enumerate(children) if kind == NodeKind.Group)
+
+
+def read_tree(file_path: str, profile: str = "auto") -> tuple[NodeTable, dict[str, NodeMeta]]:
+    """
+    Read the whole tree and the metadata of all objects of a file.
+
+    Only needs picklable arguments and results, so that it can run in worker processes.
+    """
+    table = NodeTable(file_path)
+    metadata: dict[str, NodeMeta] = {}
+    with open_file(file_path, profile) as file:
+        for node, group, children in iter_tree(file, table):
+            datasets = (name for name, kind in children if kind == NodeKind.Dataset)
+            metadata.update(read_group_meta(group, table.path(node), datasets))
+    return table, metadata
@@ -0,0 +1,120 @@
+"""Bounded text previews of datasets and groups."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import sys
+from typing import Any
+
+import h5py
+import numpy as np
+import numpy.typing as npt
+
+from src.lib_h5.access import data_reader
+
+# Number of rows of one page
+PAGE_ROWS = 100
+
+# Number of items shown at the start and end of every summarized axis
+EDGE_ITEMS = 3
+
+# Datasets with at most this many elements are shown completely
+FULL_MAX_SIZE = 1000
+
+LINE_WIDTH = 120
+
+
+def _reader(dataset: h5py.Dataset) -> Any:
+    """Dataset or its memory map, or a wrapper that decodes strings."""
+    if h5py.check_string_dtype(dataset.dtype) is not None:
+        return dataset.asstr(errors="replace")
+    return data_reader(dataset)
+
+
+def _edge_slices(length: int, edge_items: int) -> list[slice]:
+    """Slices of the start and end of an axis. One item more is read at the start, so numpy summarizes the axis."""
+    if length <= 2 * edge_items:
+        return [slice(0, length)]
+    return [slice(0, edge_items + 1), slice(length - edge_items, length)]
+
+
+def _read_edges(reader: Any, shape: tuple[int, ...], axes: list[list[slice]], prefix: tuple[slice, ...] = ()) -> Any:
+    """Read the blocks at the start and end of all axes with one hyperslab each and join them."""
+    axis = len(prefix)
+    if axis == len(shape):
+        return np.asarray(reader[prefix])
+    return np.concatenate([_read_edges(reader, shape, axes, prefix + (s,)) for s in axes[axis]], axis=axis)
+
+
+def _format(data: npt.NDArray, summarize: bool) -> str:
+    """Format array with numpy, summarized arrays show EDGE_ITEMS at every edge."""
+    threshold = 0 if summarize else sys.maxsize
+    return np.array2string(data, threshold=threshold, edgeitems=EDGE_ITEMS, max_line_width=LINE_WIDTH)
+
+
+def _scalar(data: Any) -> str:
+    if isinstance(data, np.ndarray):
+        data = data.item()
+    if isinstance(data, bytes):
+        data = data.decode(errors="replace")
+    return str(data)
+
+
+def dataset_summary(dataset: h5py.Dataset) -> str:
+    """Start and end of every axis of a dataset, formatted with numpy summarization."""
+    reader = _reader(dataset)
+    if dataset.shape is None:
+        return "Empty dataset"
+    if dataset.ndim == 0:
+        return _scalar(reader[()])
+    if dataset.size <= FULL_MAX_SIZE:
+        return _format(np.asarray(reader[()]), summarize=False)
+    axes = [_edge_slices(n, EDGE_ITEMS) for n in dataset.shape]
+    return _format(_read_edges(reader, dataset.shape, axes), summarize=True)
+
+
+def dataset_page(dataset: h5py.Dataset, start: int, rows: int = PAGE_ROWS) -> str:
+    """Rows start to start + rows of a dataset, one line per row. All other axes are summarized."""
+    if dataset.shape is None or dataset.ndim == 0:
+        return dataset_summary(dataset)
+    reader = _reader(dataset)
+    stop = min(start + rows, dataset.shape[0])
+    axes = [[slice(start, stop)]] + [_edge_slices(n, EDGE_ITEMS) for n in dataset.shape[1:]]
+    data = _read_edges(reader, dataset.shape, axes)
+    width = len(str(dataset.shape[0] - 1))
+    lines = []
+    for i, row in enumerate(data, start=start):
+        text = _scalar(row) if np.ndim(row) == 0 else _format(row, summarize=True)
+        lines.append(f"[{i:>{width}}] {text}")
+    return "\n".join(lines)
+
+
+def group_page(group: h5py.Group, start: int, rows: int = PAGE_ROWS) -> str:
+    """Names of the members start to start + rows of a group. Only the names on the page are read."""
+    stop = min(start + rows, len(group))
+    names = []
+    for i in range(start, stop):
+        name = group.id.get_objname_by_idx(i)
+        names.append(name.decode(errors="replace") if isinstance(name, bytes) else str(name))
+    return "\n".join(names)
+
+
+def row_count(obj: h5py.Group | h5py.Dataset) -> int:
+    """Get number of rows that can be paged through."""
+    if isinstance(obj, h5py.Group):
+        return len(obj)
+    if obj.shape is None or obj.ndim == 0:
+        return 1
+    return int(obj.shape[0])
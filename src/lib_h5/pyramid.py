@@ -0,0 +1,204 @@
+"""Multi-resolution pyramid of large images."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import h5py
+import numpy as np
+import numpy.typing as npt
+
+from src.lib_h5.access import READ_BLOCK_BYTES, data_reader
+
+# Images larger than this are shown as pyramid
+PYRAMID_MIN_BYTES = 64 * 1024**2
+
+# Maximum edge length of the coarsest level, the one that is shown first
+OVERVIEW_SIZE = 2048
+
+# Edge length of tiles in pixels of their level
+TILE_SIZE = 256
+
+
+def image_shape(dataset: h5py.Dataset) -> None | tuple[int, int]:
+    """Shape of the image of 2D datasets, or of the channel sum of 3D datasets. None for other datasets."""
+    if dataset.dtype.kind not in "iuf" or dataset.ndim not in (2, 3):
+        return None
+    return int(dataset.shape[-2]), int(dataset.shape[-1])
+
+
+def _block_mean(
+    dataset: h5py.Dataset,
+    rows: tuple[int, int],
+    cols: tuple[int, int],
+    factor: int,
+    callback: None | Callable[[int, int], bool] = None,
+) -> None | npt.NDArray:
+    """
+    Mean of factor x factor blocks of a region of the image. Blocks at the edge may be smaller.
+
+    The region is read in stripes of rows that are aligned to the chunks of the dataset. 3D datasets are summed over
+    their first axis. Returns None if callback returned False.
+    """
+    r0, r1 = rows
+    c0, c1 = cols
+    n_channels = dataset.shape[0] if dataset.ndim == 3 else 1
+    row_bytes = max(1, (c1 - c0) * dataset.dtype.itemsize * n_channels)
+    stripe = max(factor, READ_BLOCK_BYTES // row_bytes // factor * factor)
+    if dataset.chunks is not None:
+        aligned = math.lcm(factor, dataset.chunks[-2])
+        if aligned * row_bytes <= 4 * READ_BLOCK_BYTES:
+            stripe = max(aligned, stripe // aligned * aligned)
+
+    col_idx = np.arange(0, c1 - c0, factor)
+    col_count: npt.NDArray[np.int64] = np.diff(np.append(col_idx, c1 - c0))
+    reader = data_reader(dataset)
+    out: npt.NDArray[np.float64] = np.empty((-(-(r1 - r0) // factor), len(col_idx)), dtype=np.float64)
+    for a in range(r0, r1, stripe):
+        e = min(a + stripe, r1)
+        if dataset.ndim == 3:
+            block = np.sum(reader[:, a:e, c0:c1], axis=0, dtype=np.float64)
+        else:
+            block = np.asarray(reader[a:e, c0:c1], dtype=np.float64)
+        row_idx = np.arange(0, e - a, factor)
+        row_count: npt.NDArray[np.int64] = np.diff(np.append(row_idx, e - a))
+        sums = np.add.reduceat(np.add.reduceat(block, row_idx, axis=0), col_idx, axis=1)
+        out_start = (a - r0) // factor
+        out_stop = out_start + len(row_idx)
+        out[out_start:out_stop] = sums / np.outer(row_count, col_count)
+        if callback is not None and not callback(e - r0, r1 - r0):
+            return None
+    return out
+
+
+class ImagePyramid:
+    """
+    Downsampled levels of a large image.
+
+    The overview level is computed once from the whole dataset, levels between it and full resolution are only read
+    in tiles when they are shown. Factors of all levels are powers of two.
+    """
+
+    def __init__(self, shape: tuple[int, int], overview: npt.NDArray, overview_factor: int, max_tiles: int = 256):
+        """Downsampled levels of a large image."""
+        self.shape = shape
+        self.overview = overview
+        self.overview_factor = overview_factor
+        self._tiles: OrderedDict[tuple[int, int, int], npt.NDArray] = OrderedDict()
+        self._max_tiles = max_tiles
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by overview and cached tiles."""
+        return int(self.overview.nbytes + sum(tile.nbytes for tile in self._tiles.values()))
+
+    @classmethod
+    def from_dataset(
+        cls, dataset: h5py.Dataset, callback: None | Callable[[int, int], bool] = None
+    ) -> "None | ImagePyramid":
+        """Compute the overview level chunk-wise. Returns None if callback returned False."""
+        shape = image_shape(dataset)
+        if shape is None:
+            raise ValueError(f"can not build image pyramid of dataset with shape {dataset.shape}")
+        factor = 1 << max(0, math.ceil(math.log2(max(shape) / OVERVIEW_SIZE)))
+        overview = _block_mean(dataset, (0, shape[0]), (0, shape[1]), factor, callback)
+        if overview is None:
+            return None
+        return cls(shape, overview, factor)
+
+    def level_factor(self, pixel_size: float) -> int:
+        """Factor of the level that has about one image pixel per screen pixel of size pixel_size."""
+        if pixel_size <= 1:
+            return 1
+        return min(self.overview_factor, 1 << int(math.log2(pixel_size)))
+
+    def tile(self, dataset: h5py.Dataset, factor: int, tile_row: int, tile_col: int) -> npt.NDArray:
+        """Tile of the level with the given factor. Tiles are cached."""
+        key = (factor, tile_row, tile_col)
+        with self._lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                return self._tiles[key]
+
+        size = TILE_SIZE * factor
+        rows = (tile_row * size, min((tile_row + 1) * size, self.shape[0]))
+        cols = (tile_col * size, min((tile_col + 1) * size, self.shape[1]))
+        tile = _block_mean(dataset, rows, cols, factor)
+        assert tile is not None
+
+        with self._lock:
+            self._tiles[key] = tile
+            while len(self._tiles) > self._max_tiles:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def region(
+        self,
+        dataset: h5py.Dataset,
+        factor: int,
+        rows: tuple[int, int],
+        cols: tuple[int, int],
+        cancelled: None | Callable[[], bool] = None,
+    ) -> None | tuple[npt.NDArray, tuple[int, int]]:
+        """
+        Mosaic of all tiles of a level that intersect a region given in full resolution pixels.
+
+        :return: mosaic and its origin in full resolution pixels, or None if cancelled
+        """
+        size = TILE_SIZE * factor
+        tile_rows = range(max(0, rows[0]) // size, -(-min(rows[1], self.shape[0]) // size))
+        tile_cols = range(max(0, cols[0]) // size, -(-min(cols[1], self.shape[1]) // size))
+        if not tile_rows or not tile_cols:
+            return None
+
+        mosaic_rows = []
+        for tile_row in tile_rows:
+            tiles = []
+            for tile_col in tile_cols:
+                if cancelled is not None and cancelled():
+                    return None
+                tiles.append(self.tile(dataset, factor, tile_row, tile_col))
+            mosaic_rows.append(np.concatenate(tiles, axis=1))
+        return np.concatenate(mosaic_rows, axis=0), (tile_rows[0] * size, tile_cols[0] * size)
+
+
+class PyramidCache:
+    """Pyramids of recently shown images, least recently used pyramids are dropped first."""
+
+    def __init__(self, max_bytes: int = 512 * 1024**2) -> None:
+        """Pyramids of recently shown images, least recently used pyramids are dropped first."""
+        self.max_bytes = max_bytes
+        self._pyramids: OrderedDict[Hashable, ImagePyramid] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> None | ImagePyramid:
+        """Get cached pyramid."""
+        with self._lock:
+            if (pyramid := self._pyramids.get(key)) is not None:
+                self._pyramids.move_to_end(key)
+            return pyramid
+
+    def put(self, key: Hashable, pyramid: ImagePyramid) -> None:
+        """Cache pyramid."""
+        with self._lock:
+            self._pyramids[key] = pyramid
+            self._pyramids.move_to_end(key)
+            while len(self._pyramids) > 1 and sum(p.nbytes for p in self._pyramids.values()) > self.max_bytes:
+                self._pyramids.popitem(last=False)
@@ -1,4 +1,4 @@
-"""Recursive iterators for files and groups."""
+"""Streaming walker over the objects of a file."""
 
 # Copyright (C) 2023 Dennis Lönard
 #
@@ -16,39 +16,97 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import pathlib
+from enum import IntEnum
+from typing import Iterator, NamedTuple
 
 import h5py
+from natsort import natsorted
+
+from src.lib_h5.access import open_file
+
+
+class NodeKind(IntEnum):
+    """Kind of a node in the file tree."""
+
+    File = 0
+    Group = 1
+    Dataset = 2
+
+    @property
+    def label(self) -> str:
+        """Text shown in the Type column."""
+        return "HDF5 File" if self == NodeKind.File else self.name
+
+
+class NodeRecord(NamedTuple):
+    """One object found by walk. Groups have no shape and an empty dtype."""
+
+    path: str
+    depth: int
+    is_last: bool
+    kind: NodeKind
+    shape: None | tuple[int, ...]
+    dtype: str
+
+
+_OBJECT_KINDS = {h5py.h5o.TYPE_GROUP: NodeKind.Group, h5py.h5o.TYPE_DATASET: NodeKind.Dataset}
+
+
+def group_children(group_id: h5py.h5g.GroupID) -> list[tuple[str, NodeKind]]:
+    """
+    Natsorted names and kinds of the direct children of a group. Other objects and dangling links are skipped.
+
+    Uses the low-level API only: link names are read in one iteration and kinds from the object headers, without
+    opening the children.
+    """
+    names: list[bytes] = []
+    group_id.links.iterate(names.append)
+    children = []
+    for name in natsorted(name.decode() for name in names):
+        try:
+            kind = _OBJECT_KINDS.get(h5py.h5o.get_info(group_id, name.encode()).type)
+        except (KeyError, OSError, RuntimeError):
+            continue
+        if kind is not None:
+            children.append((name, kind))
+    return children
+
+
+def walk(group: h5py.Group) -> Iterator[NodeRecord]:
+    """
+    Walk depth first through all objects below a group, in the order of the tree view.
+
+    Records are yielded while walking, so that large files can be processed without holding the whole tree. Groups
+    that are linked more than once are yielded at every location, but only walked through at their first one.
+    """
+    visited = {hash(group.id)}
+    # children of every open group in reverse order, so that the next one is popped from the end
+    stack = [(group.id, group.name.rstrip("/"), group_children(group.id)[::-1])]
+    while stack:
+        group_id, prefix, children = stack[-1]
+        if not children:
+            stack.pop()
+            continue
+        name, kind = children.pop()
+        path = f"{prefix}/{name}"
+        depth = len(stack) - 1
+        if kind == NodeKind.Dataset:
+            dataset_id = h5py.h5d.open(group_id, name.encode())
+            yield NodeRecord(path, depth, not children, kind, dataset_id.shape, str(dataset_id.dtype))
+            continue
+        yield NodeRecord(path, depth, not children, kind, None, "")
+        child_id = h5py.h5g.open(group_id, name.encode())
+        if hash(child_id) not in visited:
+            visited.add(hash(child_id))
+            stack.append((child_id, path, group_children(child_id)[::-1]))
+
+
+def walk_file(file_path: str | pathlib.Path, profile: str = "auto") -> Iterator[NodeRecord]:
+    """Open a file once and walk through all of its objects."""
+    with open_file(file_path, profile) as file:
+        yield from walk(file)
 
 
 def recursive_h5(file_path: pathlib.Path) -> list[tuple[str, int, bool]]:
-    """Iterate recursively through file."""
-    item_list = []
-    with h5py.File(file_path, "r") as file:
-        for i, (name, obj) in enumerate(file.items()):
-            is_last = i == len(file) - 1
-            if str(type(obj)) == "<class 'h5py._hl.group.Group'>":
-                item_list.append((name, 0, is_last))
-                for e in recursive_group(file_path, f"{name}", 1):
-                    item_list.append(e)
-
-            elif str(type(obj)) == "<class 'h5py._hl.dataset.Dataset'>":
-                item_list.append((f"{name}", 0, is_last))
-
-    return item_list
-
-
-def recursive_group(file_path: pathlib.Path, group: str, depth: int) -> list[tuple[str, int, bool]]:
-    """Iterate recursively through group."""
-    item_list = []
-    with h5py.File(file_path, "r") as file:
-        for i, (name, obj) in enumerate(file[group].items()):
-            is_last = i == len(file[group]) - 1
-            if str(type(obj)) == "<class 'h5py._hl.group.Group'>":
-                item_list.append((name, depth, is_last))
-                for e in recursive_group(file_path, f"{group}/{name}", depth + 1):
-                    item_list.append(e)
-
-            elif str(type(obj)) == "<class 'h5py._hl.dataset.Dataset'>":
-                item_list.append((f"{name}", depth, is_last))
-
-    return item_list
+    """Names, depths and last-child flags of all groups and datasets of a file, depth first."""
+    return [(record.path.rsplit("/", 1)[-1], record.depth, record.is_last) for record in walk_file(file_path)]
@@ -0,0 +1,162 @@
+"""Search of object paths, attributes, dtypes and shapes of a file."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import bisect
+import math
+import operator
+import re
+from array import array
+from typing import Callable, Iterable, Iterator
+
+from src.lib_h5.metadata import NodeMeta
+from src.lib_h5.node_table import NodeTable
+
+_OPERATORS: dict[str, Callable[[float, float], bool]] = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    "!=": operator.ne,
+    "==": operator.eq,
+    "=": operator.eq,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+_PREDICATE = re.compile(r"^(shape\[(-?\d+)\]|ndim|size)(>=|<=|!=|==|=|>|<)([-+.\deE]+)$")
+
+
+class SearchQuery:
+    """
+    Parsed search query. All parts of a query must match.
+
+    Parts of the form dtype:float32 match datasets whose dtype starts with the given text. Parts like shape[0]>1e6,
+    ndim=2 or size<=100 compare the shape of datasets. All other parts are searched in object paths, attribute names
+    and attribute values, either as text or as regular expressions.
+    """
+
+    def __init__(self, text: str, regex: bool = False, case_sensitive: bool = False) -> None:
+        """
+        Parse search query.
+
+        :raises re.error: if a part is not a valid regular expression
+        """
+        flags = 0 if case_sensitive else re.IGNORECASE
+        self.patterns: list[re.Pattern[str]] = []
+        self.predicates: list[Callable[[NodeMeta], bool]] = []
+        for part in text.split():
+            if part.startswith("dtype:") and len(part) > len("dtype:"):
+                self.predicates.append(_dtype_predicate(part.removeprefix("dtype:")))
+            elif (match := _PREDICATE.match(part)) is not None and _is_number(match.group(4)):
+                self.predicates.append(_shape_predicate(match.group(1), match.group(2), match.group(3), match.group(4)))
+            else:
+                self.patterns.append(re.compile(part if regex else re.escape(part), flags))
+
+    def __bool__(self) -> bool:
+        """Check if the query has any part."""
+        return bool(self.patterns or self.predicates)
+
+
+def _is_number(text: str) -> bool:
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+
+def _dtype_predicate(dtype: str) -> Callable[[NodeMeta], bool]:
+    return lambda meta: meta.shape is not None and meta.dtype.startswith(dtype)
+
+
+def _shape_predicate(key: str, axis: None | str, op: str, value: str) -> Callable[[NodeMeta], bool]:
+    compare = _OPERATORS[op]
+    number = float(value)
+
+    def predicate(meta: NodeMeta) -> bool:
+        if meta.shape is None:
+            return False
+        if key == "ndim":
+            return compare(len(meta.shape), number)
+        if key == "size":
+            return compare(math.prod(meta.shape), number)
+        i = int(axis or 0)
+        return -len(meta.shape) <= i < len(meta.shape) and compare(meta.shape[i], number)
+
+    return predicate
+
+
+class FileSearchIndex:
+    """
+    Search text of all nodes of a file.
+
+    The path, attribute names and attribute values of every node are stored as one line of a single string, line n
+    belongs to node n. A query is matched with one regular expression scan over the whole string, which runs in C, and
+    the offsets of the matches are mapped to nodes by bisecting the line offsets.
+    """
+
+    def __init__(self, table: NodeTable, metadata: None | dict[str, NodeMeta] = None) -> None:
+        """Search text of all nodes of a file."""
+        paths = table.paths()
+        self.size = len(paths)
+        self._metas: list[None | NodeMeta] = [None] * self.size if metadata is None else list(map(metadata.get, paths))
+        # the file node is found by its file name
+        paths[0] = table.name(0)
+        lines = []
+        for path, meta in zip(paths, self._metas):
+            if meta is None or not meta.attrs:
+                lines.append(path)
+            else:
+                attrs = "\t".join(f"{name}={value}" for name, value in meta.attrs)
+                lines.append(f"{path}\t{attrs}".replace("\n", " "))
+        self._text = "\n".join(lines) + "\n"
+        self._line_starts = array("q", [0])
+        for line in lines[:-1]:
+            self._line_starts.append(self._line_starts[-1] + len(line) + 1)
+
+    def _line(self, node: int) -> str:
+        end = self._line_starts[node + 1] - 1 if node + 1 < self.size else len(self._text) - 1
+        start = self._line_starts[node]
+        return self._text[start:end]
+
+    def _scan(self, pattern: re.Pattern[str], nodes: None | Iterable[int] = None) -> Iterator[int]:
+        """Nodes whose line matches pattern, either of all nodes or of the given ones."""
+        if nodes is not None:
+            yield from (node for node in nodes if pattern.search(self._line(node)))
+            return
+        pos = 0
+        while (match := pattern.search(self._text, pos)) is not None:
+            node = bisect.bisect_right(self._line_starts, match.start()) - 1
+            yield node
+            if node + 1 >= self.size:
+                return
+            pos = self._line_starts[node + 1]
+
+    def search(self, query: SearchQuery, nodes: None | Iterable[int] = None) -> Iterator[int]:
+        """Nodes that match all parts of a query, in node order. Only the given nodes are searched if not None."""
+        if query.patterns:
+            candidates: Iterator[int] = self._scan(query.patterns[0], nodes)
+        else:
+            candidates = iter(range(self.size) if nodes is None else nodes)
+        for pattern in query.patterns[1:]:
+            candidates = self._scan(pattern, candidates)
+        for predicate in query.predicates:
+            candidates = self._filter(predicate, candidates)
+        return candidates
+
+    def _filter(self, predicate: Callable[[NodeMeta], bool], nodes: Iterable[int]) -> Iterator[int]:
+        for node in nodes:
+            if (meta := self._metas[node]) is not None and predicate(meta):
+                yield node
@@ -0,0 +1,137 @@
+"""Frames of datasets with more than two dimensions."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import itertools
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+import h5py
+import numpy as np
+import numpy.typing as npt
+
+from src.lib_h5.access import data_reader
+
+# Frames of neighboring indices are read together with the requested one if they share its chunks and the whole
+# block is not larger than this
+FRAME_BLOCK_BYTES = 64 * 1024**2
+
+
+class Frame(NamedTuple):
+    """
+    2D frame of a dataset.
+
+    Axis 0 of the image is display_axes[0] of the dataset, axis 1 is display_axes[1]. The position has one entry per
+    axis of the dataset, entries of the display axes are 0.
+    """
+
+    display_axes: tuple[int, int]
+    position: tuple[int, ...]
+    image: npt.NDArray
+
+
+def frame_index(index: tuple[int, ...], display_axes: tuple[int, int]) -> tuple[int, ...]:
+    """Index with the entries of the display axes set to 0, so that it identifies a frame."""
+    return tuple(0 if axis in display_axes else i for axis, i in enumerate(index))
+
+
+def _scrub_ranges(dataset: h5py.Dataset, display_axes: tuple[int, int], index: tuple[int, ...]) -> list[range]:
+    """
+    Get the indices of every scrubbed axis that are read together with index.
+
+    For chunked datasets these are the indices that lie in the same chunks as index, as the chunks have to be
+    decompressed completely anyway. Contiguous datasets, or blocks larger than FRAME_BLOCK_BYTES, read only index.
+    """
+    single = [range(i, i + 1) for i in index]
+    if dataset.chunks is None:
+        return single
+    frame_bytes = dataset.dtype.itemsize * dataset.shape[display_axes[0]] * dataset.shape[display_axes[1]]
+    ranges = []
+    for axis, (i, n, chunk) in enumerate(zip(index, dataset.shape, dataset.chunks)):
+        start = i // chunk * chunk
+        ranges.append(range(start, min(start + chunk, n)) if axis not in display_axes else range(0, 1))
+    if frame_bytes * np.prod([len(r) for r in ranges], dtype=np.int64) > FRAME_BLOCK_BYTES:
+        return single
+    return ranges
+
+
+def read_frames(dataset: h5py.Dataset, display_axes: tuple[int, int], index: tuple[int, ...]) -> list[Frame]:
+    """
+    Read the frame at index and all frames that share its chunks with one hyperslab selection.
+
+    :param dataset: numeric dataset with at least 3 dimensions
+    :param display_axes: two different axes that are shown as image
+    :param index: one entry per axis, entries of the display axes are ignored
+    :return: frames, the one at index first
+    """
+    index = frame_index(index, display_axes)
+    ranges = _scrub_ranges(dataset, display_axes, index)
+    selection = tuple(slice(None) if axis in display_axes else slice(r.start, r.stop) for axis, r in enumerate(ranges))
+    # views of memory mapped datasets only read the pages of the selected frames
+    block = data_reader(dataset)[selection]
+    if block.dtype.kind == "b":
+        block = block.astype(np.uint8)
+    # move the display axes to the end, in the order they are shown
+    scrub_axes = [axis for axis in range(dataset.ndim) if axis not in display_axes]
+    block = np.moveaxis(block, list(display_axes), [-2, -1])
+
+    frames = []
+    for scrub_index in itertools.product(*(ranges[axis] for axis in scrub_axes)):
+        full_index = list(index)
+        for axis, i in zip(scrub_axes, scrub_index):
+            full_index[axis] = i
+        offsets = tuple(i - ranges[axis].start for axis, i in zip(scrub_axes, scrub_index))
+        frames.append(Frame(display_axes, tuple(full_index), np.ascontiguousarray(block[offsets])))
+    frames.sort(key=lambda frame: frame.position != index)
+    return frames
+
+
+class FrameCache:
+    """Recently read frames of one dataset, least recently used frames are dropped first."""
+
+    def __init__(self, max_bytes: int = 256 * 1024**2) -> None:
+        """Recently read frames of one dataset, least recently used frames are dropped first."""
+        self.max_bytes = max_bytes
+        self._frames: OrderedDict[tuple[tuple[int, int], tuple[int, ...]], Frame] = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, display_axes: tuple[int, int], index: tuple[int, ...]) -> None | Frame:
+        """Get cached frame."""
+        key = (display_axes, frame_index(index, display_axes))
+        with self._lock:
+            if (frame := self._frames.get(key)) is not None:
+                self._frames.move_to_end(key)
+            return frame
+
+    def put(self, frame: Frame) -> None:
+        """Cache frame."""
+        key = (frame.display_axes, frame.position)
+        with self._lock:
+            if (old_frame := self._frames.pop(key, None)) is not None:
+                self._nbytes -= old_frame.image.nbytes
+            self._frames[key] = frame
+            self._nbytes += frame.image.nbytes
+            while len(self._frames) > 1 and self._nbytes > self.max_bytes:
+                _, dropped = self._frames.popitem(last=False)
+                self._nbytes -= dropped.image.nbytes
+
+    def clear(self) -> None:
+        """Drop all frames."""
+        with self._lock:
+            self._frames.clear()
+            self._nbytes = 0
@@ -0,0 +1,276 @@
+"""Statistics and histogram of datasets, computed block by block."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+import h5py
+import numpy as np
+import numpy.typing as npt
+
+from src.lib_h5.access import data_reader, open_dataset, open_file, row_blocks
+
+# Maximum size of one block, also the size of the jobs of worker processes
+STATS_BLOCK_BYTES = 64 * 1024**2
+
+# Maximum number of bins of a histogram
+HISTOGRAM_BINS = 256
+
+# Percentiles of the values that are used as color levels of images
+LEVEL_PERCENTILES = (0.1, 99.9)
+
+
+def has_statistics(dataset: h5py.Dataset) -> bool:
+    """Check if statistics can be computed for a dataset: non-empty and of real numbers."""
+    return dataset.shape is not None and dataset.size > 0 and dataset.dtype.kind in "biuf"
+
+
+class Histogram:
+    """
+    Counts of values in bins of width 2**exponent that start at multiples of their width.
+
+    Bins are made wider when values outside of them are added, so at most max_bins are used. As all bins lie on the
+    same grid, histograms of different blocks can be merged exactly.
+    """
+
+    def __init__(self, max_bins: int = HISTOGRAM_BINS, integer: bool = False) -> None:
+        """Count values in bins of width 2**exponent that start at multiples of their width."""
+        self.max_bins = max_bins
+        self.integer = integer
+        self.exponent: None | int = None
+        self.first = 0
+        self.counts: npt.NDArray[np.int64] = np.zeros(0, dtype=np.int64)
+
+    @property
+    def width(self) -> float:
+        """Width of one bin."""
+        return 0.0 if self.exponent is None else math.ldexp(1.0, self.exponent)
+
+    @property
+    def edges(self) -> npt.NDArray:
+        """Edges of all bins, one more than bins."""
+        return (self.first + np.arange(len(self.counts) + 1)) * self.width
+
+    def _min_exponent(self, lo: float, hi: float) -> int:
+        """Smallest exponent whose bins fit between lo and hi and can still be numbered exactly."""
+        exponent = math.frexp(max(hi - lo, 1e-300) / self.max_bins)[1]
+        # bin numbers are computed in float64, which counts exactly up to 2**52
+        exponent = max(exponent, math.frexp(max(abs(lo), abs(hi), 1e-300))[1] - 52)
+        return max(exponent, 0) if self.integer else exponent
+
+    def _regrid(self, exponent: int, first: int, n_bins: int) -> None:
+        """Move the counts to bins of a larger or equal exponent that cover them."""
+        shift = 0 if self.exponent is None else exponent - self.exponent
+        old_bins = (self.first + np.arange(len(self.counts))) >> shift
+        counts: npt.NDArray[np.int64] = np.zeros(n_bins, dtype=np.int64)
+        if len(self.counts):
+            np.add.at(counts, old_bins - first, self.counts)
+        self.exponent, self.first, self.counts = exponent, first, counts
+
+    def _cover(self, lo: float, hi: float, exponent: int) -> None:
+        """Regrid so that the values between lo and hi fall into bins."""
+        if self.exponent is not None:
+            exponent = max(exponent, self.exponent)
+        while True:
+            width = math.ldexp(1.0, exponent)
+            first = math.floor(lo / width)
+            last = math.floor(hi / width)
+            if self.exponent is not None and len(self.counts):
+                shift = exponent - self.exponent
+                first = min(first, self.first >> shift)
+                last = max(last, (self.first + len(self.counts) - 1) >> shift)
+            if last - first < self.max_bins:
+                break
+            exponent += 1
+        if (exponent, first, last - first + 1) != (self.exponent, self.first, len(self.counts)):
+            self._regrid(exponent, first, last - first + 1)
+
+    def add(self, values: npt.NDArray) -> None:
+        """Count finite values."""
+        if values.size == 0:
+            return
+        lo, hi = float(values.min()), float(values.max())
+        self._cover(lo, hi, self._min_exponent(lo, hi))
+        bins = np.floor(values / self.width).astype(np.int64) - self.first
+        self.counts += np.bincount(bins.ravel(), minlength=len(self.counts))[: len(self.counts)]
+
+    def merge(self, other: "Histogram") -> None:
+        """Add the counts of another histogram."""
+        if other.exponent is None or not len(other.counts):
+            return
+        lo = other.first * other.width
+        hi = (other.first + len(other.counts) - 1) * other.width
+        self._cover(lo, hi, other.exponent)
+        shift = self.exponent - other.exponent  # type: ignore[operator]
+        other_bins = (other.first + np.arange(len(other.counts))) >> shift
+        np.add.at(self.counts, other_bins - self.first, other.counts)
+
+    def percentile(self, q: float) -> float:
+        """Value below which q percent of the counted values lie, interpolated within its bin."""
+        total = int(self.counts.sum())
+        if total == 0:
+            return math.nan
+        cumulative = np.cumsum(self.counts)
+        target = q / 100 * total
+        i = min(int(np.searchsorted(cumulative, target)), len(self.counts) - 1)
+        below = cumulative[i] - self.counts[i]
+        fraction = (target - below) / self.counts[i] if self.counts[i] else 0.0
+        return float((self.first + i + min(max(fraction, 0.0), 1.0)) * self.width)
+
+
+class Statistics:
+    """
+    Count, NaN and infinity count, minimum, maximum, mean, standard deviation and histogram of values.
+
+    Statistics of blocks are merged with the parallel algorithm of Chan et al., so mean and variance stay accurate for
+    any number of blocks.
+    """
+
+    def __init__(self, integer: bool = False) -> None:
+        """Count, NaN and infinity count, minimum, maximum, mean, standard deviation and histogram of values."""
+        self.count = 0
+        self.nan_count = 0
+        self.inf_count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.histogram = Histogram(integer=integer)
+        # number of values of the dataset that were added so far, including NaN and infinity
+        self.done = 0
+        self.total = 0
+
+    @property
+    def std(self) -> float:
+        """Standard deviation of the finite values."""
+        return math.sqrt(self._m2 / self.count) if self.count else math.nan
+
+    @property
+    def complete(self) -> bool:
+        """Check if all values of the dataset were added."""
+        return self.done >= self.total
+
+    def levels(self) -> None | tuple[float, float]:
+        """Color levels of images of the values, None if there are no finite values."""
+        if self.count == 0:
+            return None
+        lo, hi = (self.histogram.percentile(q) for q in LEVEL_PERCENTILES)
+        lo, hi = max(lo, self.min), min(hi, self.max)
+        return (lo, hi) if lo < hi else (self.min, self.max)
+
+    def add(self, block: npt.NDArray) -> None:
+        """Add the values of a block."""
+        values = np.asarray(block)
+        if values.dtype.kind == "b":
+            values = values.astype(np.uint8)
+        self.done += values.size
+        if values.dtype.kind == "f":
+            finite = np.isfinite(values)
+            if not finite.all():
+                nan = np.isnan(values)
+                self.nan_count += int(nan.sum())
+                self.inf_count += int(values.size - finite.sum() - nan.sum())
+                values = values[finite]
+        if values.size == 0:
+            return
+        block_stats = Statistics()
+        block_stats.count = int(values.size)
+        block_stats.min = float(values.min())
+        block_stats.max = float(values.max())
+        block_stats.mean = float(np.mean(values, dtype=np.float64))
+        block_stats._m2 = float(np.sum(np.square(values - block_stats.mean, dtype=np.float64)))
+        self._merge_moments(block_stats)
+        self.histogram.add(values)
+
+    def _merge_moments(self, other: "Statistics") -> None:
+        count = self.count + other.count
+        if count == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self._m2 += other._m2 + delta**2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def merge(self, other: "Statistics") -> None:
+        """Add the statistics of another block."""
+        self._merge_moments(other)
+        self.nan_count += other.nan_count
+        self.inf_count += other.inf_count
+        self.done += other.done
+        self.histogram.merge(other.histogram)
+
+
+def block_statistics(dataset: h5py.Dataset, start: int, stop: int) -> Statistics:
+    """Statistics of the rows start to stop of a dataset."""
+    stats = Statistics(integer=dataset.dtype.kind in "biu")
+    reader = data_reader(dataset)
+    stats.add(reader[()] if dataset.ndim == 0 else reader[start:stop])
+    return stats
+
+
+def file_block_statistics(file_path: str, obj_path: str, start: int, stop: int, profile: str = "auto") -> Statistics:
+    """Statistics of the rows start to stop of a dataset in a file. Arguments and result can be sent to processes."""
+    with open_file(file_path, profile) as file:
+        return block_statistics(open_dataset(file, obj_path), start, stop)
+
+
+def dataset_statistics(
+    dataset: h5py.Dataset, callback: None | Callable[[Statistics], bool] = None
+) -> None | Statistics:
+    """
+    Compute statistics block by block.
+
+    :param dataset: dataset of real numbers
+    :param callback: called with the statistics of all blocks so far after every block, return False to cancel
+    :return: statistics, or None if cancelled
+    """
+    stats = Statistics(integer=dataset.dtype.kind in "biu")
+    stats.total = dataset.size
+    for start, stop in row_blocks(dataset, STATS_BLOCK_BYTES):
+        stats.merge(block_statistics(dataset, start, stop))
+        if callback is not None and not callback(stats):
+            return None
+    return stats
+
+
+class StatisticsCache:
+    """Statistics by file identity and dataset path, least recently used statistics are dropped first."""
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        """Statistics by file identity and dataset path, least recently used statistics are dropped first."""
+        self.max_entries = max_entries
+        self._stats: OrderedDict[Hashable, Statistics] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> None | Statistics:
+        """Get cached statistics."""
+        with self._lock:
+            if (stats := self._stats.get(key)) is not None:
+                self._stats.move_to_end(key)
+            return stats
+
+    def put(self, key: Hashable, stats: Statistics) -> None:
+        """Cache statistics."""
+        with self._lock:
+            self._stats[key] = stats
+            self._stats.move_to_end(key)
+            while len(self._stats) > self.max_entries:
+                self._stats.popitem(last=False)
@@ -0,0 +1,121 @@
+"""On-disk cache of the trees and metadata of files."""
+
+# Copyright (C) 2023 Dennis Lönard
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import time
+import zlib
+from contextlib import closing
+
+from src.lib_h5.metadata import NodeMeta
+from src.lib_h5.node_table import NodeTable
+
+# Increase when the format of the cached tables or metadata changes
+CACHE_VERSION = 1
+
+
+def file_identity(file_path: str | os.PathLike[str]) -> tuple[str, int, int, int]:
+    """Path, size, modification time and inode of a file, they change when the file is replaced or modified."""
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+class StructureCache:
+    """
+    Trees and metadata of files stored in an SQLite database.
+
+    Entries are keyed by the absolute path of a file and only used while its size, modification time and inode are
+    unchanged. When the cache is larger than max_bytes, the least recently used entries are removed first. Every call
+    uses its own connection, so the cache can be used from any thread.
+    """
+
+    def __init__(self, cache_file: str | pathlib.Path, max_bytes: int = 256 * 1024**2) -> None:
+        """Trees and metadata of files stored in an SQLite database."""
+        self.cache_file = pathlib.Path(cache_file)
+        self.max_bytes = max_bytes
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as db, db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, version INTEGER, "
+                "accessed REAL, nbytes INTEGER, tree BLOB, meta BLOB)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.cache_file, timeout=10)
+
+    def get(self, file_path: str | pathlib.Path) -> None | tuple[NodeTable, dict[str, NodeMeta]]:
+        """Get cached tree and metadata of a file, None if the file is not cached or changed since it was cached."""
+        try:
+            path, size, mtime_ns, inode = file_identity(file_path)
+            with closing(self._connect()) as db, db:
+                row = db.execute(
+                    "SELECT size, mtime_ns, inode, version, tree, meta FROM files WHERE path = ?", (path,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if tuple(row[:4]) != (size, mtime_ns, inode, CACHE_VERSION):
+                    db.execute("DELETE FROM files WHERE path = ?", (path,))
+                    return None
+                db.execute("UPDATE files SET accessed = ? WHERE path = ?", (time.time(), path))
+            table = NodeTable.from_bytes(zlib.decompress(row[4]))
+            # the file may have been cached under another relative path, the tree shows the requested one
+            table.set_file_name(os.fspath(file_path))
+            metadata = {
+                obj_path: NodeMeta(None if shape is None else tuple(shape), dtype, tuple(map(tuple, attrs)))
+                for obj_path, shape, dtype, attrs in json.loads(zlib.decompress(row[5]))
+            }
+        except (OSError, sqlite3.Error, zlib.error, ValueError) as err:
+            logging.warning(f"Failed to read '{file_path}' from structure cache. Error: '{err}'")
+            return None
+        return table, metadata
+
+    def put(self, file_path: str | pathlib.Path, table: NodeTable, metadata: dict[str, NodeMeta]) -> None:
+        """Cache tree and metadata of a file and drop least recently used entries if the cache is full."""
+        try:
+            path, size, mtime_ns, inode = file_identity(file_path)
+            tree = zlib.compress(table.to_bytes())
+            meta = zlib.compress(
+                json.dumps([[obj_path, *node_meta] for obj_path, node_meta in metadata.items()]).encode()
+            )
+            with closing(self._connect()) as db, db:
+                db.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, size, mtime_ns, inode, CACHE_VERSION, time.time(), len(tree) + len(meta), tree, meta),
+                )
+                self._evict(db)
+        except (OSError, sqlite3.Error) as err:
+            logging.warning(f"Failed to write '{file_path}' to structure cache. Error: '{err}'")
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        """Delete least recently used entries until the cache is smaller than max_bytes."""
+        total = db.execute("SELECT COALESCE(SUM(nbytes), 0) FROM files").fetchone()[0]
+        for path, nbytes in db.execute("SELECT path, nbytes FROM files ORDER BY accessed").fetchall()[:-1]:
+            if total <= self.max_bytes:
+                break
+            db.execute("DELETE FROM files WHERE path = ?", (path,))
+            total -= nbytes
+
+    def clear(self) -> None:
+        """Delete all entries."""
+        with closing(self._connect()) as db, db:
+            db.execute("DELETE FROM files")
+        with closing(self._connect()) as db:
+            db.execute("VACUUM")
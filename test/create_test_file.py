@@ -19,6 +19,29 @@ def main() -> None:
         file.create_dataset("Array1D/ColumnVector", data=np.array([[1], [2], [3], [4], [5]]))
         file.create_dataset("Array1D/RowVector", data=np.array([[1, 2, 3, 4, 5]]))
         file.create_dataset("Array1D/LongRowVector", data=np.array([[i for i in range(150)]]))
+        file.create_dataset("Array1D/Boolean", data=np.array([True, False, True, True, False]))
+        file.create_dataset(
+            "Array1D/Enum",
+            data=np.array([0, 1, 1, 0], dtype=np.uint8),
+            dtype=h5py.enum_dtype({"OFF": 0, "ON": 1}, basetype=np.uint8),
+        )
+
+        # images
+        file.create_dataset("Array2D/Image", data=np.random.rand(200, 300))
+        image = file.create_dataset("Array2D/ImageClass", data=np.random.rand(20, 3))
+        image.attrs["CLASS"] = np.bytes_("IMAGE")
+        file.create_dataset("ImageRGB/Channels", data=np.random.rand(3, 64, 64))
+
+        # tables
+        file.create_dataset("Table/Small", data=np.random.rand(5, 4))
+        file.create_dataset("Table/Complex", data=np.array([1 + 2j, 3 - 4j]))
+        compound = np.array([(1, 0.5, b"a"), (2, 1.5, b"b")], dtype=[("id", "i4"), ("value", "f8"), ("name", "S4")])
+        file.create_dataset("Table/Compound", data=compound)
+
+        # strings
+        file.create_dataset("String/Scalar", data="text")
+        file.create_dataset("String/VariableLength", data=["a", "bb", "ccc"], dtype=h5py.string_dtype())
+        file.create_dataset("String/Array4D", data=np.zeros((2, 2, 2, 2)))
 
 
 if __name__ == "__main__":